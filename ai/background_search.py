@@ -0,0 +1,124 @@
+"""
+This module houses the BackgroundSearch class, a handle for running an
+AlphaBeta search on a worker thread without blocking the caller.
+"""
+import os
+import sys
+import threading
+
+sys.path.append(os.path.realpath('..'))
+from ai.search import AlphaBeta
+
+
+class BackgroundSearch:
+    """
+    Runs an AlphaBeta search on a worker thread. The caller can poll for the best
+    move found so far, stop the search early, or wait for it to finish, and may
+    pass a callback to be told the move once the search is done.
+
+    The callback runs on the worker thread, so a Tk caller should hand the move
+    back to its own thread, for example with root.after.
+    """
+
+    def __init__(self, search=None, callback=None):
+        """
+        Initializes a BackgroundSearch object.
+
+        :param search: an AlphaBeta object to search with, or None for a new one
+        :param callback: a function taking the chosen Move, called when each search finishes, or None
+        """
+        self.search = search or AlphaBeta()
+        self.callback = callback
+        self._thread = None
+        self._stop_event = threading.Event()
+        self._result = None
+
+    @property
+    def running(self):
+        """
+        Returns whether a search is in progress.
+
+        :return: a bool
+        """
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, state, heuristic_func, max_time=None):
+        """
+        Starts searching the given state on a worker thread and returns at once.
+        Any search already in progress is stopped first.
+
+        :param state: a State object, copied so the caller may change it
+        :param heuristic_func: the heuristic function to use
+        :param max_time: an int of the max time to search, or None to keep the search's own
+        :return: this BackgroundSearch object
+        """
+        self.stop()
+        self.wait()
+        if max_time is not None:
+            self.search.max_time = max_time
+        self._stop_event = threading.Event()
+        self._result = None
+        self.search.best_move_found = None
+        self._thread = threading.Thread(target=self._run, args=(state.copy(), heuristic_func, self._stop_event),
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self, state, heuristic_func, stop_event):
+        """
+        Runs the search on the worker thread and reports its result.
+
+        :param state: a State object
+        :param heuristic_func: the heuristic function to use
+        :param stop_event: a threading.Event that stops the search once set
+        :return: None
+        """
+        self._result = self.search.start_new_search(state, heuristic_func, stop_event=stop_event)
+        if self.callback is not None:
+            self.callback(self._result)
+
+    def stop(self):
+        """
+        Tells the search in progress to stop; it finishes shortly after with the best
+        move found so far. Returns without waiting for it.
+
+        :return: None
+        """
+        self._stop_event.set()
+
+    def poll_best_move(self):
+        """
+        Returns the best move found so far: the chosen move once the search has
+        finished, otherwise the best move of the deepest depth completed.
+
+        :return: a Move object, or None if no depth has completed yet
+        """
+        if self._result is not None:
+            return self._result
+        return self.search.best_move_found
+
+    def wait(self, timeout=None):
+        """
+        Waits for the search in progress to finish and returns its chosen move.
+
+        :param timeout: a number of seconds to wait at most, or None to wait until it finishes
+        :return: a Move object, or None if the search has not finished
+        """
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return None if self.running else self._result
+
+
+if __name__ == "__main__":
+    from time import sleep
+    from ai.heuristics import Heuristics
+    from state_space_gen.file_processor import FileProcessor
+
+    # TEST: search in the background, poll while it runs, then stop it early
+    background_search = BackgroundSearch(AlphaBeta(None), lambda move: print(f"Callback: {move}"))
+    background_search.start(FileProcessor.get_state_from_file("../dist/test_inputs/Test1.input"), Heuristics.evaluate)
+    for _ in range(3):
+        sleep(1)
+        print(f"Best move so far: {background_search.poll_best_move()}")
+    background_search.stop()
+    print(f"Stopped with: {background_search.wait()}")
@@ -0,0 +1,129 @@
+"""
+This module houses the BatchEvaluator class, which scores many states at
+once with NumPy arrays instead of one State at a time.
+
+NumPy is optional: without it NUMPY_AVAILABLE is False, and the search
+evaluates states one at a time as usual.
+"""
+import os
+import sys
+
+sys.path.append(os.path.realpath('..'))
+from ai.heuristics import Heuristics
+from layouts.board_tables import CELL_COUNT, CENTER_VALUES, NEIGHBOURS
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+NUMPY_AVAILABLE = np is not None
+
+if NUMPY_AVAILABLE:
+    _CELL_SHIFTS = np.arange(CELL_COUNT, dtype=np.uint64)
+    _CENTER_VALUES = np.array(CENTER_VALUES)
+    # every pair of adjacent cells once, each cell paired with its neighbours to the R, BL and BR
+    _PAIRS = [(cell, NEIGHBOURS[cell][direction]) for cell in range(CELL_COUNT) for direction in (1, 4, 5)
+              if NEIGHBOURS[cell][direction] != -1]
+    # _ADJACENCY[first, second] is 1 for each of those pairs, so (board @ _ADJACENCY) * board counts them
+    _ADJACENCY = np.zeros((CELL_COUNT, CELL_COUNT))
+    _ADJACENCY[tuple(zip(*_PAIRS))] = 1
+
+
+class BatchEvaluator:
+    """
+    Scores boards with Heuristics.evaluate, a whole array of them at a time.
+
+    Boards are (N, 61) int8 arrays over the cells of layouts.board_tables, holding
+    the NodeValue of each cell: 0 for empty, 1 for player 1 and 2 for player 2.
+    """
+
+    # The heuristic this class scores boards with
+    heuristic = Heuristics.evaluate
+
+    @staticmethod
+    def get_boards(blacks, whites):
+        """
+        Returns the boards for the given bitboards.
+
+        :param blacks: a list of int bitboards of player 1's marbles
+        :param whites: a list of int bitboards of player 2's marbles, one for each in blacks
+        :return: an (N, 61) int8 array
+        """
+        black_bits = (np.array(blacks, dtype=np.uint64)[:, None] >> _CELL_SHIFTS) & 1
+        white_bits = (np.array(whites, dtype=np.uint64)[:, None] >> _CELL_SHIFTS) & 1
+        return (black_bits + 2 * white_bits).astype(np.int8)
+
+    @classmethod
+    def evaluate(cls, boards, players):
+        """
+        Returns the Heuristics.evaluate score of every board, from the perspective
+        of the player who has the turn on it.
+
+        :param boards: an (N, 61) int8 array
+        :param players: an (N,) array of the player who has the turn on each board, 1 or 2
+        :return: an (N,) float array
+        """
+        black = (boards == 1).astype(np.float64)
+        white = (boards == 2).astype(np.float64)
+        # the centering and marble count terms are both weighted sums over the cells
+        values = (black - white) @ (Heuristics.w_center * _CENTER_VALUES + Heuristics.w_score)
+        # each pair of adjacent marbles counts 2 from each end in Heuristics.eval_grouping
+        pairs = np.einsum("ij,ij->i", black @ _ADJACENCY, black) - np.einsum("ij,ij->i", white @ _ADJACENCY, white)
+        values += Heuristics.w_group * 4 * pairs
+        return np.where(np.asarray(players) == 1, values, -values)
+
+    @classmethod
+    def evaluate_states(cls, states):
+        """
+        Returns the Heuristics.evaluate score of every state.
+
+        :param states: a list of State objects
+        :return: an (N,) float array
+        """
+        boards = cls.get_boards([state.black for state in states], [state.white for state in states])
+        return cls.evaluate(boards, [state.player for state in states])
+
+    @classmethod
+    def evaluate_children(cls, state, moves):
+        """
+        Returns the Heuristics.evaluate score of the state each move leads to, from the
+        perspective of the other player, who has the turn there. The moves are not made.
+
+        :param state: a State object
+        :param moves: a list of Moves generated from the state
+        :return: an (N,) float array
+        """
+        blacks, whites = [], []
+        for move in moves:
+            changed, black, white = move.change_matrix.masks
+            blacks.append((state.black & ~changed) | black)
+            whites.append((state.white & ~changed) | white)
+        other_player = state.get_other_player_num(state.player)
+        return cls.evaluate(cls.get_boards(blacks, whites), np.full(len(moves), other_player))
+
+
+if __name__ == "__main__":
+    from random import Random
+    from time import perf_counter
+    from state_space_gen.file_processor import FileProcessor
+    from state_space_gen.state_space_generator import StateSpaceGenerator
+
+    # TEST: compare batched scores and throughput with evaluating one state at a time
+    random = Random(0)
+    test_states = []
+    for file_name in ("Test1.input", "Test2.input", "Test3.input"):
+        test_state = FileProcessor.get_state_from_file(f"../dist/test_inputs/{file_name}")
+        for _ in range(100):
+            test_state = test_state.apply_move(random.choice(StateSpaceGenerator(test_state).generate_all_valid_moves()))
+            test_states.append(test_state)
+    test_states *= 100
+
+    start = perf_counter()
+    single_scores = [Heuristics.evaluate(test_state.copy()) for test_state in test_states]
+    single_timer = perf_counter() - start
+    start = perf_counter()
+    batch_scores = BatchEvaluator.evaluate_states(test_states)
+    batch_timer = perf_counter() - start
+    print(f"Single: {len(test_states) / single_timer:.0f} states/s, batched: {len(test_states) / batch_timer:.0f} "
+          f"states/s, same scores: {single_scores == batch_scores.tolist()}")
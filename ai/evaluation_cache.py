@@ -0,0 +1,89 @@
+"""
+This module houses the EvaluationCache class, which remembers heuristic
+values by Zobrist hash so positions evaluated again, in a later depth of
+iterative deepening or through another move order, are not evaluated twice.
+"""
+from collections import OrderedDict
+
+
+class EvaluationCache:
+    """
+    A bounded cache of heuristic values, keyed by the Zobrist hash of the state
+    and the heuristic function that evaluated it. Once full, the least recently
+    used value makes room for each new one.
+
+    Values are stored from the perspective of the player who has the turn,
+    which the Zobrist hash includes.
+    """
+
+    # Estimated bytes used by one cached value: its OrderedDict entry, key tuple and value
+    ENTRY_SIZE = 250
+
+    def __init__(self, size_mb=8):
+        """
+        Initializes an EvaluationCache object.
+
+        :param size_mb: a number of the memory budget in megabytes
+        """
+        self.capacity = max(1, int(size_mb * 2 ** 20 // self.ENTRY_SIZE))
+        self._values = OrderedDict()
+        # performance trackers
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        """
+        Returns the number of values in this cache.
+
+        :return: an int
+        """
+        return len(self._values)
+
+    def new_search(self):
+        """
+        Marks the start of a new search, resetting the hit and miss counts.
+        Cached values are kept, as they stay correct from one search to the next.
+
+        :return: None
+        """
+        self.hits = 0
+        self.misses = 0
+
+    def clear(self):
+        """
+        Removes all values from this cache.
+
+        :return: None
+        """
+        self._values.clear()
+
+    def probe(self, state, heuristic_func):
+        """
+        Returns the cached value of the given state according to the given heuristic.
+
+        :param state: a State object
+        :param heuristic_func: the heuristic function the value was evaluated with
+        :return: a number, or None if it is not cached
+        """
+        key = state.zobrist_hash, heuristic_func
+        value = self._values.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._values.move_to_end(key)
+        return value
+
+    def store(self, state, heuristic_func, value):
+        """
+        Caches the exact value of the given state according to the given heuristic,
+        evicting the least recently used value if the cache is full.
+
+        :param state: a State object
+        :param heuristic_func: the heuristic function the value was evaluated with
+        :param value: a number
+        :return: None
+        """
+        self._values[state.zobrist_hash, heuristic_func] = value
+        if len(self._values) > self.capacity:
+            self._values.popitem(last=False)
@@ -8,6 +8,8 @@ import sys
 
 sys.path.append(os.path.realpath('..'))
 from core.move import Direction
+from layouts.board_tables import CELL_BITS, CELL_COORDS, CELL_INDEX, CENTER_VALUE_BOUNDS, CENTER_VALUES, \
+    MAX_ADJACENT_PAIRS, NEIGHBOURS, NEIGHBOUR_MASKS, count_adjacent_pairs, get_cells_from_bitboard
 
 
 class Heuristics:
@@ -44,9 +46,9 @@ class Heuristics:
         :param player: an int
         :return: an list of
         """
-        adj_nodes = [state.get_node_in_direction_of_node(node, direction)
-                     for direction in Direction]
-        return [node for node in adj_nodes if node.node_value.value == player]
+        player_bitboard = state.get_bitboard_for_player(player)
+        return [state.get_node(*CELL_COORDS[adj_cell]) for adj_cell in NEIGHBOURS[CELL_INDEX[node.row][node.column]]
+                if adj_cell != -1 and player_bitboard & CELL_BITS[adj_cell]]
 
     @staticmethod
     def get_adjacent_enemies(state, node, player):
@@ -58,46 +60,85 @@ class Heuristics:
         :param player: an int
         :return: an int
         """
-        return len([1 for direction in Direction if state
-                   .get_node_in_direction_of_node(node, direction).node_value.value == player])
+        return (NEIGHBOUR_MASKS[CELL_INDEX[node.row][node.column]] & state.get_bitboard_for_player(player)).bit_count()
 
     @classmethod
     def evaluate(cls, state):
-        centering = cls.w_center * cls.eval_centering(state)
-        grouping = cls.w_group * cls.eval_grouping(state)
-        scoring = cls.w_score * cls.eval_scoring(state)
-        return centering + grouping + scoring
+        """
+        Returns the weighted sum of eval_centering, eval_grouping and eval_scoring, from
+        the terms the state keeps up to date as moves are made instead of rescanning the board.
+
+        :param state: a State object
+        :return: a number
+        """
+        centering, pairs, black_count, white_count = state.eval_terms
+        # each pair of adjacent marbles counts 2 from each end in eval_grouping
+        value = cls.w_center * centering + cls.w_group * 4 * pairs + cls.w_score * (black_count - white_count)
+        return value if state.player == 1 else -value
+
+    @classmethod
+    def evaluate_lazily(cls, state, alpha, beta):
+        """
+        Returns evaluate's value of the state, computing its terms from the bitboards cheapest
+        first: the marble counts, then the centering, then the adjacent pairs. Before each
+        expensive term, the most the remaining terms could add or take away is bounded; once
+        that puts the value outside the window, the bound is returned instead, which is at
+        most alpha when the value is, and at least beta when the value is.
+
+        :param state: a State object
+        :param alpha: a number of the highest value the player who has the turn is assured of
+        :param beta: a number of the lowest value the other player is assured of
+        :return: a number, exact only if it is between alpha and beta
+        """
+        black, white = state.black, state.white
+        # the terms are summed for player 1 and the window turned to match
+        sign, low_window, high_window = (1, alpha, beta) if state.player == 1 else (-1, -beta, -alpha)
+        black_count, white_count = black.bit_count(), white.bit_count()
+        value = cls.w_score * (black_count - white_count)
+
+        least_black, most_black = CENTER_VALUE_BOUNDS[black_count]
+        least_white, most_white = CENTER_VALUE_BOUNDS[white_count]
+        # each pair of adjacent marbles counts 2 from each end in eval_grouping
+        group_weight = cls.w_group * 4
+        grouping_low = -group_weight * MAX_ADJACENT_PAIRS[white_count]
+        grouping_high = group_weight * MAX_ADJACENT_PAIRS[black_count]
+        high = value + cls.w_center * (most_black - least_white) + grouping_high
+        if high <= low_window:
+            return sign * high
+        low = value + cls.w_center * (least_black - most_white) + grouping_low
+        if low >= high_window:
+            return sign * low
+
+        value += cls.w_center * (sum(CENTER_VALUES[cell] for cell in get_cells_from_bitboard(black))
+                                 - sum(CENTER_VALUES[cell] for cell in get_cells_from_bitboard(white)))
+        if value + grouping_high <= low_window:
+            return sign * (value + grouping_high)
+        if value + grouping_low >= high_window:
+            return sign * (value + grouping_low)
+
+        value += group_weight * (count_adjacent_pairs(black) - count_adjacent_pairs(white))
+        return sign * value
 
     @classmethod
     def eval_centering(cls, state):
         ally_ratio, enemy_ratio = 1, 1
-        total = 0
-        both_players_nodes = cls.get_both_players_nodes(state)
-        for node in both_players_nodes:
-            if node.node_value.value == state.player:
-                total += ally_ratio * cls.center_value(node)
-            else:
-                total -= enemy_ratio * cls.center_value(node)
-        return total
+        ally_bitboard = state.get_bitboard_for_player(state.player)
+        enemy_bitboard = state.get_bitboard_for_player(state.get_other_player_num(state.player))
+        return ally_ratio * sum(CENTER_VALUES[cell] for cell in get_cells_from_bitboard(ally_bitboard)) - \
+            enemy_ratio * sum(CENTER_VALUES[cell] for cell in get_cells_from_bitboard(enemy_bitboard))
 
     @staticmethod
     def center_value(node):
-        horizontal_centerness = abs(7.5 - ((9 - (9 - node.row)) / 2 + node.column))
-        vertical_centerness = abs(5 - node.row)
-        return (6 - horizontal_centerness) * (6 - horizontal_centerness) + \
-               (6 - vertical_centerness) * (6 - vertical_centerness)
+        return CENTER_VALUES[CELL_INDEX[node.row][node.column]]
 
     @classmethod
     def eval_grouping(cls, state):
         ally_ratio, enemy_ratio = 1, 1
         total = 0
-        other_player = state.get_other_player_num(state.player)
-        both_players_nodes = cls.get_both_players_nodes(state)
-        for node in both_players_nodes:
-            if node.node_value.value == state.player:
-                total += ally_ratio * len(cls.get_adjacent_allies(state, node, state.player)) * 2
-            else:
-                total -= enemy_ratio * len(cls.get_adjacent_allies(state, node, other_player)) * 2
+        for ratio, player in ((ally_ratio, state.player), (-enemy_ratio, state.get_other_player_num(state.player))):
+            player_bitboard = state.get_bitboard_for_player(player)
+            for cell in get_cells_from_bitboard(player_bitboard):
+                total += ratio * (NEIGHBOUR_MASKS[cell] & player_bitboard).bit_count() * 2
         return total
 
     @classmethod
@@ -123,20 +164,16 @@ class HeuristicsSunmin:
         opp_nodes = state.get_all_nodes_for_player(state.get_other_player_num(state.player))
         h += len(self_nodes) * 80
         h -= len(opp_nodes) * 80
+        h += Heuristics.eval_centering(state)
         for node in self_nodes:
-            h += HeuristicsSunmin.centerness_value(node)
             h += HeuristicsSunmin.togetherness_value(state, node, state.player)
         for node in opp_nodes:
-            h -= HeuristicsSunmin.centerness_value(node)
             h -= HeuristicsSunmin.togetherness_value(state, node, state.get_other_player_num(state.player))
         return h
 
     @staticmethod
     def centerness_value(node):
-        horizontal_centerness = abs(7.5 - ((9 - (9 - node.row)) / 2 + node.column))
-        vertical_centerness = abs(5 - node.row)
-        return (6 - horizontal_centerness) * (6 - horizontal_centerness) + \
-               (6 - vertical_centerness) * (6 - vertical_centerness)
+        return CENTER_VALUES[CELL_INDEX[node.row][node.column]]
 
     @staticmethod
     def togetherness_value(state, node, player):
@@ -238,3 +275,35 @@ class HeuristicsMan:
             value = value + self.PUSH_OPPONENT_MARBLE_OFF_BOARD_VALUE
 
         return value
+
+
+if __name__ == "__main__":
+    from random import Random
+    from time import perf_counter
+    from state_space_gen.file_processor import FileProcessor
+    from state_space_gen.state_space_generator import StateSpaceGenerator
+
+    # TEST: time each evaluation from scratch over positions reached by random moves from the test inputs
+    random = Random(0)
+    test_states = []
+    for file_name in ("Test1.input", "Test2.input", "Test3.input"):
+        test_state = FileProcessor.get_state_from_file(f"../dist/test_inputs/{file_name}")
+        for _ in range(100):
+            test_state = test_state.apply_move(random.choice(StateSpaceGenerator(test_state).generate_all_valid_moves()))
+            test_states.append(test_state)
+
+    for name, evaluation in (("eval_centering", Heuristics.eval_centering),
+                             ("eval_grouping", Heuristics.eval_grouping),
+                             ("eval_scoring", Heuristics.eval_scoring),
+                             ("evaluate_lazily, full window",
+                              lambda state: Heuristics.evaluate_lazily(state, float('-inf'), float('inf'))),
+                             ("evaluate_lazily, null window at 500",
+                              lambda state: Heuristics.evaluate_lazily(state, 500, 500.25)),
+                             ("HeuristicsSunmin.heuristic", HeuristicsSunmin.heuristic)):
+        start = perf_counter()
+        total = 0
+        for _ in range(10):
+            for test_state in test_states:
+                total += evaluation(test_state.copy())  # copied so no state reuses a board view
+        timer = perf_counter() - start
+        print(f"{name}: {timer / (10 * len(test_states)) * 1e6:.1f} us per state, total {total}")
@@ -0,0 +1,178 @@
+"""
+This module houses the ParallelAlphaBeta class, which splits the root
+moves of an Alpha-Beta search across a pool of processes that share
+one transposition table.
+"""
+import contextlib
+import os
+import sys
+
+sys.path.append(os.path.realpath('..'))
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
+from ai.search import AlphaBeta
+from ai.transposition_table import Bound, SharedTranspositionTable
+from state_space_gen.file_processor import FileProcessor
+from state_space_gen.state_space_generator import StateSpaceGenerator
+
+
+def search_root_moves(state, move_keys, heuristic_func, max_time, transposition_table, search_options):
+    """
+    Runs an iteratively deepened search over the given root moves only. Runs in a
+    worker process, so it takes and returns move keys rather than Moves.
+
+    :param state: a State object
+    :param move_keys: a list of the keys of the root Moves to choose from
+    :param heuristic_func: the heuristic function to use
+    :param max_time: a number of seconds to search for
+    :param transposition_table: a SharedTranspositionTable to search with
+    :param search_options: a dict of keyword arguments for AlphaBeta
+    :return: a tuple of a list of (move key, value) of the best move at each finished depth,
+             and an int of the nodes searched
+    """
+    generator = StateSpaceGenerator(state)
+    root_moves = [generator.generate_move_from_key(move_key) for move_key in move_keys]
+    search = AlphaBeta(max_time, transposition_table=transposition_table, **search_options)
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        search.start_new_search(state, heuristic_func, root_moves)
+    return [(move.key, value) for move, value in search.completed_depths], search.nodes
+
+
+class ParallelAlphaBeta:
+    """
+    Represents an adversarial search algorithm that deals the root moves out
+    to a pool of processes, each running its own AlphaBeta search over its share.
+
+    Each worker's best move at a depth is exact for its share, so the best move
+    overall is the best of the workers' moves at the deepest depth they all finished.
+    The workers share a transposition table, so positions reached under one
+    worker's moves are not searched again under another's. A worker's best over
+    its share is not the root's value, so workers leave the root out of the table
+    and the root's entry is only stored here, from the best of all the shares.
+    """
+
+    # Seconds kept back from max_time for starting the workers and collecting their results
+    TIME_MARGIN = 0.1
+
+    def __init__(self, max_time=5, workers=None, table_size_mb=64, **search_options):
+        """
+        Initializes an object of this class.
+
+        :param max_time: an int of the max time to search
+        :param workers: an int of the number of processes to search with, or None for one per CPU
+        :param table_size_mb: an int of the shared transposition table's size in megabytes
+        :param search_options: keyword arguments for each worker's AlphaBeta, such as quiescence_depth
+        """
+        self._max_time = max_time
+        self._best_move_found = None
+        self.workers = workers or os.cpu_count() or 1
+        self.search_options = search_options
+        self._pool = None
+        self.transposition_table = SharedTranspositionTable(table_size_mb)
+        self._table_heuristic = None
+        # performance trackers
+        self.completed_depth = 0
+        self.nodes = 0
+
+    @property
+    def max_time(self):
+        """
+        Returns the max time allowed for this search.
+
+        :return: an int
+        """
+        return self._max_time
+
+    @max_time.setter
+    def max_time(self, new_max):
+        """
+        Sets the max time to a new number.
+
+        :param new_max: an int
+        """
+        self._max_time = new_max
+
+    @property
+    def best_move_found(self):
+        """
+        Returns the best move found by the last search.
+
+        :return: a Move object
+        """
+        return self._best_move_found
+
+    def start_new_search(self, state, heuristic_func):
+        """
+        Searches the given state with every worker and returns the best move found.
+
+        :param state: a State object
+        :param heuristic_func: the heuristic to use
+        :return: a Move object
+        """
+        start_time = perf_counter()
+        generator = StateSpaceGenerator(state)
+        root_moves = generator.generate_all_valid_moves()
+        self.completed_depth = 0
+        self.nodes = 0
+        if not root_moves:
+            self._best_move_found = None
+            return None
+
+        # deal the moves out in turn so each share gets some of the likely best moves
+        shares = [root_moves[index::self.workers] for index in range(min(self.workers, len(root_moves)))]
+        if heuristic_func != self._table_heuristic:
+            # stored values are only meaningful for the heuristic that produced them
+            self.transposition_table.clear()
+            self._table_heuristic = heuristic_func
+        self.transposition_table.new_search()
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(self.workers)
+        max_time = self.max_time - self.TIME_MARGIN - (perf_counter() - start_time)
+        futures = [self._pool.submit(search_root_moves, state.copy(), [move.key for move in share],
+                                     heuristic_func, max_time, self.transposition_table, self.search_options)
+                   for share in shares]
+        results = [future.result() for future in futures]
+
+        self.nodes = sum(nodes for _, nodes in results)
+        self.completed_depth = min(len(depth_results) for depth_results, _ in results)
+        if self.completed_depth == 0:
+            self._best_move_found = root_moves[0]
+        else:
+            move_key, value = max((depth_results[self.completed_depth - 1] for depth_results, _ in results),
+                                  key=lambda move_value: move_value[1])
+            self.transposition_table.store(state.zobrist_hash, self.completed_depth, value, Bound.EXACT, move_key)
+            self._best_move_found = generator.generate_move_from_key(move_key)
+        print(f"Finished depth {self.completed_depth} with {len(shares)} workers "
+              f"- current timer {perf_counter() - start_time}")
+        return self._best_move_found
+
+    def close(self):
+        """
+        Shuts down the worker processes and frees the shared transposition table.
+        This object cannot search after it is closed.
+
+        :return: None
+        """
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        self.transposition_table.close()
+
+
+if __name__ == "__main__":
+    from ai.heuristics import Heuristics
+
+    # TEST: compare the depth and nodes reached in the same time by one process and by the pool
+    heuristic = Heuristics.evaluate
+    single_search = AlphaBeta(5)
+    parallel_search = ParallelAlphaBeta(5)
+
+    for file_name in ("Test1.input", "Test2.input", "Test3.input"):
+        test_state = FileProcessor.get_state_from_file(f"../dist/test_inputs/{file_name}")
+        print(f"\n{file_name}")
+        single_move = single_search.start_new_search(test_state, heuristic)
+        parallel_move = parallel_search.start_new_search(test_state, heuristic)
+        print(f"Single: {single_move}, depth {len(single_search.completed_depths)}, nodes {single_search.nodes}")
+        print(f"Parallel: {parallel_move}, depth {parallel_search.completed_depth}, nodes {parallel_search.nodes}, "
+              f"speedup {parallel_search.nodes / max(single_search.nodes, 1):.2f}x nodes")
+    parallel_search.close()
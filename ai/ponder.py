@@ -0,0 +1,140 @@
+"""
+This module houses the Ponderer class, which keeps the AI searching on
+the opponent's time.
+"""
+import os
+import sys
+
+sys.path.append(os.path.realpath('..'))
+from time import perf_counter
+from ai.background_search import BackgroundSearch
+
+
+class Ponderer:
+    """
+    After the AI moves, searches in the background the position that the expected
+    reply from the opponent would lead to, so the search and its transposition
+    table are already warm when the AI's turn comes.
+
+    If the opponent plays the expected reply (a ponder hit), the background search
+    simply carries on as the AI's search: it answers at once if it has already
+    searched for the AI's target time, otherwise once it has. On any other reply
+    the background search is stopped and the AI searches as usual.
+    """
+
+    def __init__(self, search, time_manager):
+        """
+        Initializes a Ponderer object.
+
+        :param search: an AlphaBeta object, used for both pondering and the AI's own searches
+        :param time_manager: a TimeManager object
+        """
+        self.search = search
+        self.time_manager = time_manager
+        self._background_search = BackgroundSearch(search)
+        self._ponder_hash = None  # hash of the state being pondered on
+        self._ponder_heuristic = None
+        # performance trackers
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def pondering(self):
+        """
+        Returns whether a background search is in progress.
+
+        :return: a bool
+        """
+        return self._background_search.running
+
+    def start(self, game, ai_move, heuristic_func):
+        """
+        Starts pondering after the AI played the given move, if its last search
+        expected a reply from the opponent. Returns at once.
+
+        :param game: a Game object with the AI's move applied
+        :param ai_move: the Move the AI played
+        :param heuristic_func: the heuristic the AI will search its next move with
+        :return: None
+        """
+        self.stop()
+        if self.on_move not in game.move_listeners:
+            game.move_listeners.append(self.on_move)
+        variation = self.search.principal_variation
+        if len(variation) < 2 or variation[0].key != ai_move.key:
+            return
+        ponder_state = game.state.apply_move(variation[1])
+        self._ponder_hash = ponder_state.zobrist_hash
+        self._ponder_heuristic = heuristic_func
+        self.search.max_time = None  # searches until the opponent moves
+        self._background_search.start(ponder_state, heuristic_func)
+
+    def stop(self):
+        """
+        Stops pondering and waits for the background search to finish.
+
+        :return: None
+        """
+        self._background_search.stop()
+        self._background_search.wait()
+        self._ponder_hash = None
+
+    def on_move(self, game, move):
+        """
+        Stops pondering as soon as a move other than the expected reply is played.
+        Called by the Game after each move.
+
+        :param game: a Game object with the move applied
+        :param move: the Move played
+        :return: None
+        """
+        if self._ponder_hash is not None and game.state.zobrist_hash != self._ponder_hash:
+            self.misses += 1
+            self.stop()
+
+    def choose_move(self, game, heuristic_func):
+        """
+        Returns the AI's move in the given game, taking it from the background search
+        on a ponder hit and otherwise searching with the time manager.
+
+        :param game: a Game object with the AI to move
+        :param heuristic_func: the heuristic function to use
+        :return: a Move object
+        """
+        if self._ponder_hash == game.state.zobrist_hash and self._ponder_heuristic == heuristic_func \
+                and self.pondering:
+            self.hits += 1
+            _, target_time = self.time_manager.get_move_times(game)
+            pondered_time = perf_counter() - self.search.start_time
+            if pondered_time < target_time:
+                self._background_search.wait(target_time - pondered_time)
+            self._background_search.stop()
+            ai_move = self._background_search.wait()
+            self._ponder_hash = None
+            if ai_move is not None:
+                return ai_move
+        self.stop()
+        return self.time_manager.choose_move(self.search, game, heuristic_func)
+
+
+if __name__ == "__main__":
+    from time import sleep
+    from ai.heuristics import Heuristics
+    from ai.search import AlphaBeta
+    from ai.time_manager import TimeManager
+    from core.game import Game
+    from gui.settings import Settings
+
+    # TEST: play the AI's move, let the opponent "think" while pondering, then answer the expected reply
+    test_game = Game(Settings(1, 1, 2, 0, 10, 10))
+    ponderer = Ponderer(AlphaBeta(), TimeManager())
+    first_move = ponderer.choose_move(test_game, Heuristics.evaluate)
+    test_game.apply_move(first_move)
+    expected_reply = ponderer.search.principal_variation[1]
+    ponderer.start(test_game, first_move, Heuristics.evaluate)
+    sleep(3)
+    test_game.apply_move(expected_reply)
+    start = perf_counter()
+    reply = ponderer.choose_move(test_game, Heuristics.evaluate)
+    print(f"Ponder hit: {reply} in {perf_counter() - start:.2f}s after {len(ponderer.search.completed_depths)} depths, "
+          f"hits: {ponderer.hits}, misses: {ponderer.misses}")
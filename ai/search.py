@@ -1,12 +1,18 @@
 """
 This module houses the adversarial search algorithm implementation
-for Abalone AI - Minimax and Alpha-Beta pruning.
+for Abalone AI - Negamax with Alpha-Beta pruning and principal variation search.
 """
 import os
 import sys
+import threading
 
 sys.path.append(os.path.realpath('..'))
 from time import perf_counter
+from ai.batch_evaluation import BatchEvaluator, NUMPY_AVAILABLE
+from ai.evaluation_cache import EvaluationCache
+from ai.heuristics import Heuristics
+from ai.transposition_table import TranspositionTable, Bound
+from core.move import MoveType
 from state_space_gen.file_processor import FileProcessor
 from state_space_gen.state_space_generator import StateSpaceGenerator
 
@@ -14,20 +20,93 @@ from state_space_gen.state_space_generator import StateSpaceGenerator
 class AlphaBeta:
     """
     Represents an adversarial search algorithm
-    using Minimax with Alpha-Beta pruning.
+    using Negamax with Alpha-Beta pruning and principal variation search.
     """
 
-    def __init__(self, max_time=5):
+    # Width of the window that non-first moves are searched with in principal variation search
+    NULL_WINDOW = 0.25
+    # Half-widths past which an aspiration window is dropped for the full window
+    ASPIRATION_LIMIT = 1000
+    # Fewest marbles the player who has the turn needs for a null move to be tried. With fewer,
+    # one more lost marble decides the game, so passing is no longer a safe guess at a lower bound.
+    NULL_MOVE_MIN_MARBLES = 10
+    # Most and fewest nodes searched between checks of the clock and the node limit
+    CHECK_INTERVAL = 1024
+    MIN_CHECK_INTERVAL = 16
+    # Seconds to aim for between checks of the clock, a small fraction of any time limit
+    CHECK_TIME = 0.01
+
+    def __init__(self, max_time=5, table_size_mb=16, quiescence_depth=4, use_pvs=True, aspiration_window=50,
+                 null_move_reduction=2, lmr_moves=4, lmr_reduction=1, transposition_table=None,
+                 max_depth=None, node_limit=None, batch_evaluation=False, eval_cache_mb=8,
+                 lazy_evaluation=False):
         """
         Initializes an object of this class.
 
-        :param max_time: an int of the max time to search
+        For searches that give the same result on every run, set max_time to None
+        and limit the search by max_depth or node_limit instead.
+
+        :param max_time: an int of the max time to search, or None for no time limit
+        :param table_size_mb: an int of the transposition table's memory budget in megabytes
+        :param quiescence_depth: an int of the most Push and Scoring moves to follow past the
+                                 max depth, 0 to evaluate the max depth as it stands
+        :param use_pvs: a bool, True to search moves after the first with a null window,
+                        False to search every move with the full window
+        :param aspiration_window: an int of how far either side of the previous depth's score
+                                  to search each depth at first, 0 to always use the full window
+        :param null_move_reduction: an int of how much shallower to search after passing the turn,
+                                    0 to never try null moves
+        :param lmr_moves: an int of how many moves to search at full depth before reducing quiet moves
+        :param lmr_reduction: an int of how much shallower to search reduced moves, 0 to never reduce
+        :param transposition_table: a TranspositionTable to search with, such as a SharedTranspositionTable,
+                                    or None for a new one of table_size_mb
+        :param max_depth: an int of the deepest depth to search to, or None for no depth limit
+        :param node_limit: an int of the most nodes to search, or None for no node limit
+        :param batch_evaluation: a bool, True to score the moves after the first one ply from the max depth
+                                 in one batched call when searching with Heuristics.evaluate; ignored without NumPy
+        :param eval_cache_mb: a number of the evaluation cache's memory budget in megabytes,
+                              0 to evaluate every state afresh
+        :param lazy_evaluation: a bool, True to let Heuristics.evaluate stop early with a bound
+                                once the value cannot fall inside the window
         """
         self._max_time = max_time
         self._best_move_found = None
         self.start_time = None
+        self._stop_event = threading.Event()
+        self.max_depth = max_depth
+        self.node_limit = node_limit
+        self._next_check = self.CHECK_INTERVAL  # node count at which to next check the limits
+        self.quiescence_depth = quiescence_depth
+        self.use_pvs = use_pvs
+        self.aspiration_window = aspiration_window
+        self.null_move_reduction = null_move_reduction
+        self.lmr_moves = lmr_moves
+        self.lmr_reduction = lmr_reduction
+        self.batch_evaluation = batch_evaluation and NUMPY_AVAILABLE
+        self.transposition_table = transposition_table or TranspositionTable(table_size_mb)
+        self.evaluation_cache = EvaluationCache(eval_cache_mb) if eval_cache_mb else None
+        self.lazy_evaluation = lazy_evaluation
+        self._table_heuristic = None
+        self.root_scores = {}  # root move key: value at the deepest depth the move was searched to
+        self.completed_depths = []  # (Move, value) of the best root move at each finished depth
+        self.depth_callback = None  # function given this object after each finished depth, returns False to stop
+        self.principal_variation = []  # Moves of the best line found by the last finished depth
+        self._pv_moves = {}  # state hash: key of the principal variation's move from that state
+        self._pv_table = []  # the best line found below each ply in the current depth
+        self._iteration_best_move = None
+        self._partial_root = False  # True when only some of the root's legal moves are searched
+        self.killer_moves = [[] for _ in range(100)]  # per ply, keys of the last two quiet moves to cause a cutoff
+        self.history = {}  # move key: score, increased by every cutoff the quiet move causes
         # performance trackers
         self.pruned = 0
+        self.nodes = 0
+        self.re_searches = 0
+        self.aspiration_searches = 0
+        self.fail_lows = 0
+        self.fail_highs = 0
+        self.null_cutoffs = 0
+        self.reductions = 0
+        self.batched_nodes = 0
 
     @property
     def max_time(self):
@@ -65,49 +144,163 @@ class AlphaBeta:
         """
         self._best_move_found = new_move
 
-    def out_of_time(self):
+    @property
+    def stopped(self):
+        """
+        Returns whether the current search has been told to stop.
+
+        :return: a bool
+        """
+        return self._stop_event.is_set()
+
+    def stop(self):
         """
-        Checks whether time has run out for searching.
+        Tells the current search to stop. It unwinds and returns the best move found
+        so far; this may be called from any thread.
 
-        :return: True if time ran out, otherwise False
+        :return: None
         """
-        return perf_counter() - self.start_time >= self.max_time
+        self._stop_event.set()
 
-    def start_new_search(self, state, heuristic_func):
+    def start_new_search(self, state, heuristic_func, root_moves=None, stop_event=None):
         """
-        Resets all attributes and begins a new search.
+        Resets all attributes and begins a new search, which stops at the first of
+        max_time running out, max_depth finishing, node_limit being reached, or stop being called.
 
         :param state: a State object
         :param heuristic_func: the heuristic to use
+        :param root_moves: a list of the Moves to choose from, or None for every legal move
+        :param stop_event: a threading.Event that stops the search once set, or None for a new one
         :return: a Move object
         """
         func_name = str(heuristic_func).split(" ", 3)[-2]
         print(f"Starting search with {func_name}")
         self.pruned = 0
+        self.nodes = 0
+        self.re_searches = 0
+        self.aspiration_searches = 0
+        self.fail_lows = 0
+        self.fail_highs = 0
+        self.null_cutoffs = 0
+        self.reductions = 0
+        self.batched_nodes = 0
         self.best_move_found = None
+        self._pv_moves = {}
+        self.killer_moves = [[] for _ in range(100)]
+        self.history = {move_key: score // 2 for move_key, score in self.history.items()}
+        if heuristic_func != self._table_heuristic:
+            # stored values are only meaningful for the heuristic that produced them
+            self.transposition_table.clear()
+            self._table_heuristic = heuristic_func
+        self.transposition_table.new_search()
+        if self.evaluation_cache is not None:
+            self.evaluation_cache.new_search()
+        self._stop_event = stop_event or threading.Event()
+        # checked early once timed, so the rate nodes are searched at is known before it matters
+        first_check = self.CHECK_INTERVAL if self.max_time is None else self.MIN_CHECK_INTERVAL
+        self._next_check = min(first_check, self.node_limit or first_check)
         self.start_time = perf_counter()
-        return self.iter_deep_search(state, heuristic_func)
+        return self.iter_deep_search(state, heuristic_func, root_moves)
 
-    def iter_deep_search(self, state, heuristic_func):
+    def check_limits(self):
+        """
+        Stops the search if it has run out of time or reached its node limit, and sets
+        the node count at which to check again. Called every few nodes rather than at
+        every node, as reading the clock is slow next to searching a node.
+
+        A timed search checks again after about CHECK_TIME seconds at the rate it has
+        searched nodes so far, so a slow heuristic does not carry it far past max_time.
+
+        :return: None
+        """
+        interval = self.CHECK_INTERVAL
+        if self.max_time is not None:
+            elapsed = perf_counter() - self.start_time
+            if elapsed >= self.max_time:
+                self._stop_event.set()
+            if elapsed > 0:
+                interval = max(self.MIN_CHECK_INTERVAL, min(interval, int(self.nodes / elapsed * self.CHECK_TIME)))
+        self._next_check = self.nodes + interval
+        if self.node_limit is not None:
+            self._next_check = min(self._next_check, self.node_limit)
+            if self.nodes >= self.node_limit:
+                self._stop_event.set()
+
+    def iter_deep_search(self, state, heuristic_func, root_moves=None):
         """
         Iteratively deepens the search for the best move, returns the last best move
-        found when time runs out.
+        found when the search is stopped.
+
+        Each depth searches the root moves in order of their scores from the depth
+        before, and tries the previous principal variation first at every ply. If
+        the search stops partway through a depth, the best move of the root moves
+        finished at that depth is used, as the previous best move is searched first,
+        but only once it is proven better than the window's alpha. Otherwise the
+        previous depth's best move is kept.
 
         :param state: a State object
         :param heuristic_func: the heuristic to use
+        :param root_moves: a list of the Moves to choose from, or None for every legal move
         :return: a Move object
         """
-        try:
-            for depth in range(1, 100):
-                print(f"Depth {depth} - current timer {perf_counter() - self.start_time}")
-                if self.out_of_time():
-                    raise OutOfTimeException
-                self.best_move_found = self.alpha_beta_search(state, depth, heuristic_func)
-        except OutOfTimeException:
-            pass
-        return self.best_move_found
+        state = state.copy()
+        legal_moves = StateSpaceGenerator(state).generate_all_valid_moves()
+        root_moves = legal_moves if root_moves is None else list(root_moves)
+        self._partial_root = len(root_moves) < len(legal_moves)
+        self.root_scores = {}
+        self.completed_depths = []
+        self.principal_variation = []
+        for depth in range(1, (self.max_depth or 99) + 1):
+            print(f"Depth {depth} - current timer {perf_counter() - self.start_time}")
+            chosen_move = self.aspiration_search(state, depth, heuristic_func, root_moves)
+            if self.stopped:
+                if self._iteration_best_move is not None:
+                    self.best_move_found = self._iteration_best_move
+                break
+            self.best_move_found = chosen_move
+            root_moves.sort(key=lambda move: self.root_scores[move.key], reverse=True)
+            self.completed_depths.append((self.best_move_found, self.root_scores[self.best_move_found.key]))
+            if self.depth_callback is not None and not self.depth_callback(self):
+                break
+        return self.best_move_found or (root_moves[0] if root_moves else None)
+
+    def aspiration_search(self, state, max_depth, heuristic_func, root_moves):
+        """
+        Returns the estimated-best-next-move the player can make, searching with a
+        window centred on the best root move's score from the depth before. If the
+        score falls outside the window, the failed side is widened and the depth is
+        searched again until the score lands inside it, or the search is stopped.
 
-    def alpha_beta_search(self, state, max_depth, heuristic_func):
+        :param state: a State object
+        :param max_depth: an int of the max depth to search to
+        :param heuristic_func: the heuristic function to use
+        :param root_moves: a list of the legal Moves in the order to search them, best first
+        :return: a Move object
+        """
+        if not self.aspiration_window or root_moves[0].key not in self.root_scores:
+            return self.alpha_beta_search(state, max_depth, heuristic_func, root_moves)
+
+        self.aspiration_searches += 1
+        delta = self.aspiration_window
+        score = self.root_scores[root_moves[0].key]
+        alpha, beta = score - delta, score + delta
+        while True:
+            chosen_move = self.alpha_beta_search(state, max_depth, heuristic_func, root_moves, alpha, beta)
+            if self.stopped:
+                return chosen_move
+            score = self.root_scores[chosen_move.key]
+            delta *= 4
+            if score <= alpha:
+                self.fail_lows += 1
+                alpha = score - delta if delta < self.ASPIRATION_LIMIT else float('-inf')
+            elif score >= beta:
+                self.fail_highs += 1
+                beta = score + delta if delta < self.ASPIRATION_LIMIT else float('inf')
+            else:
+                return chosen_move
+
+    def alpha_beta_search(self, state, max_depth, heuristic_func, root_moves=None,
+                          alpha=float('-inf'), beta=float('inf')):
         """
         Returns the estimated-best-next-move the player can make using
         alpha-beta search algorithm.
@@ -115,112 +308,397 @@ class AlphaBeta:
         :param state: a State object
         :param max_depth: an int of the max depth to search to
         :param heuristic_func: the heuristic function to use
-        :return: a Move object
+        :param root_moves: a list of the legal Moves in the order to search them, or None to generate them
+        :param alpha: an int of the lowest score to search for
+        :param beta: an int of the highest score to search for
+        :return: a Move object, or None if the search was stopped before any move was searched
         """
-        alpha, beta, value = float('-inf'), float('inf'), float('-inf')
-        generator = StateSpaceGenerator(state)
-        moves = generator.generate_all_valid_moves()
-        next_states = generator.generate_next_states()
-        next_states_values = {}
-
-        for next_state in next_states:
-            if self.out_of_time():
-                raise OutOfTimeException
-            next_state_depth = next_state, 1
-            value = max(value, self.min_value(next_state_depth, alpha, beta, max_depth, heuristic_func))
+        alpha_orig, value = alpha, float('-inf')
+        state = state.copy()  # searched in place, so leave the caller's state untouched
+        if root_moves is None:
+            entry = self.transposition_table.probe(state.zobrist_hash)
+            root_moves = StateSpaceGenerator(state).generate_valid_moves_lazily(entry.move_key if entry else None)
+        self._pv_table = [[] for _ in range(max_depth + 1)]
+        self._iteration_best_move = None
+        chosen_move = None
+
+        for move in root_moves:
+            undo = state.make_move(move)
+            next_value = self.search_child((state, 0), alpha, beta, max_depth, heuristic_func, chosen_move is None)
+            state.unmake_move(undo)
+            if self.stopped:
+                return chosen_move
+            self.root_scores[move.key] = next_value
+            if next_value > value or chosen_move is None:
+                value, chosen_move = next_value, move
+                self._pv_table[0] = [move.key] + self._pv_table[1]
+                if value > alpha:
+                    # at or below alpha the value is only an upper bound, so the move is not proven better
+                    self._iteration_best_move = move
+            if value >= beta:
+                break
             alpha = max(alpha, value)
-            next_states_values.update({next_state: value})
 
-        max_valued_moves = [moves[next_states.index(s)]
-                            for s, v in next_states_values.items() if v == value]
-        chosen_move = max_valued_moves[0]
+        if not self._partial_root:
+            # the best of only some root moves is not the root's value, so it is kept out of the table
+            self.store_value(state, max_depth, value, alpha_orig, beta, chosen_move)
+        self.set_principal_variation(state, self._pv_table[0])
 
         # TEST: log results to console
         # print(f"Max value: {value}\nMove: {chosen_move}")
 
         return chosen_move
 
-    def max_value(self, state_depth, alpha, beta, max_depth, heuristic_func):
+    def set_principal_variation(self, state, move_keys):
+        """
+        Records the given line of moves from the given state as the principal
+        variation, keyed by the hash of the state each move is played from.
+
+        :param state: a State object, left unchanged
+        :param move_keys: a list of Move keys
+        :return: None
+        """
+        self.principal_variation = []
+        self._pv_moves = {}
+        state = state.copy()
+        for move_key in move_keys:
+            move = StateSpaceGenerator(state).generate_move_from_key(move_key)
+            if move is None:
+                break
+            self.principal_variation.append(move)
+            self._pv_moves[state.zobrist_hash] = move_key
+            state.make_move(move)
+
+    def get_first_move_key(self, state, entry):
+        """
+        Returns the key of the move to search first from the given state: the
+        principal variation's move, otherwise the transposition table's best move.
+
+        :param state: a State object
+        :param entry: a TableEntry or None
+        :return: an int or None
+        """
+        return self._pv_moves.get(state.zobrist_hash, entry.move_key if entry else None)
+
+    def negamax(self, state_depth, alpha, beta, max_depth, heuristic_func, allow_null_move=True):
         """
         For the given state, returns the highest value obtainable from the next states,
-        from the current player's perspective.
+        from the perspective of the player who has the turn.
+
+        With principal variation search, the first move is searched with the full
+        window and the rest with a null window that only proves them no better.
+        A move that fails high on the null window is searched again with the full window.
+
+        Outside the principal variation, the player first passes the turn to a shallower
+        search; if the other player still cannot get below beta, the state is cut off
+        without searching its moves. Late quiet moves are searched shallower too.
+
+        With batch evaluation, the moves after the first one ply from the max depth are
+        scored in one batched call, which orders them, or without quiescence is their value.
         :param state_depth: a tuple with a State and an int for depth
-        :param alpha: an int of the highest value found by max so far
-        :param beta: an int of the lowest value found by min so far
+        :param alpha: an int of the highest value the player who has the turn is assured of
+        :param beta: an int of the lowest value the other player is assured of
         :param max_depth: an int of the max depth to search to
         :param heuristic_func: the heuristic function to use
-        :return: an int of the highest value obtainable from next states
+        :param allow_null_move: False if the turn was just passed, so it may not be passed again
+        :return: an int of the highest value obtainable from next states, meaningless once stopped
         """
-        if self.out_of_time():
-            raise OutOfTimeException
+        if self._stop_event.is_set():
+            return 0
+        self.nodes += 1
+        if self.nodes >= self._next_check:
+            self.check_limits()
+        self._pv_table[state_depth[1]] = []
         if state_depth[1] == max_depth:
-            return self.get_value(state_depth[0], heuristic_func)
-
-        value = float('-inf')
-        generator = StateSpaceGenerator(state_depth[0])
-        next_states = generator.generate_state_space()
-
-        for next_state in next_states:
-            next_state_depth = next_state, state_depth[1] + 1
-            value = max(value, self.min_value(next_state_depth, alpha, beta, max_depth, heuristic_func))
+            return self.quiescence(state_depth[0], alpha, beta, self.quiescence_depth, heuristic_func)
+
+        state = state_depth[0]
+        depth_left = max_depth - state_depth[1]
+        entry = self.transposition_table.probe(state.zobrist_hash)
+        if entry is not None and entry.depth >= depth_left:
+            if entry.bound == Bound.EXACT:
+                return entry.value
+            if entry.bound == Bound.LOWER:
+                alpha = max(alpha, entry.value)
+            else:
+                beta = min(beta, entry.value)
+            if alpha >= beta:
+                return entry.value
+
+        if allow_null_move and self.can_try_null_move(state, depth_left, alpha, beta, heuristic_func):
+            undo = state.make_null_move()
+            null_value = -self.negamax((state, state_depth[1] + 1), -beta, -beta + self.NULL_WINDOW,
+                                       max_depth - self.null_move_reduction, heuristic_func, False)
+            state.unmake_move(undo)
+            if self._stop_event.is_set():
+                return 0
+            if null_value >= beta:
+                self.null_cutoffs += 1
+                return null_value
+
+        alpha_orig = alpha
+        value, best_move = float('-inf'), None
+        generator = StateSpaceGenerator(state)
+        killers = self.killer_moves[state_depth[1]]
+        moves = generator.generate_valid_moves_lazily(self.get_first_move_key(state, entry), killers, self.history)
+        batch = depth_left == 1 and self.batch_evaluation and heuristic_func == BatchEvaluator.heuristic
+        if batch and self.quiescence_depth:
+            moves = self.order_late_moves(state, moves)
+
+        for move_count, move in enumerate(moves):
+            reduction = self.get_reduction(move, move_count, depth_left, killers)
+            undo = state.make_move(move)
+            next_value = self.search_child(state_depth, alpha, beta, max_depth, heuristic_func, best_move is None,
+                                           reduction)
+            state.unmake_move(undo)
+            if self._stop_event.is_set():
+                return 0
+            if next_value > value:
+                value, best_move = next_value, move
+                if value > alpha:
+                    self._pv_table[state_depth[1]] = [move.key] + self._pv_table[state_depth[1] + 1]
             if value >= beta:
                 self.pruned += 1
-                return value
+                self.record_cutoff(move, state_depth[1], depth_left)
+                break
             alpha = max(alpha, value)
-
+            if batch and not self.quiescence_depth:
+                next_value, move = self.search_frontier(state, list(moves))
+                if next_value > value:
+                    value, best_move = next_value, move
+                    if value > alpha:
+                        self._pv_table[state_depth[1]] = [move.key]
+                if value >= beta:
+                    self.pruned += 1
+                    self.record_cutoff(move, state_depth[1], depth_left)
+                break
+
+        self.store_value(state, depth_left, value, alpha_orig, beta, best_move)
         return value
 
-    def min_value(self, state_depth, alpha, beta, max_depth, heuristic_func):
+    def search_child(self, state_depth, alpha, beta, max_depth, heuristic_func, first_move, reduction=0):
         """
-        For the given state, returns the lowest value obtainable from the next states,
-        from the current player's perspective.
-        :param state_depth: a tuple with a State and an int for depth
-        :param alpha: an int of the highest value found by max so far
-        :param beta: an int of the lowest value found by min so far
+        Returns the value of the state reached by a move from the given state, from
+        the perspective of the player who made the move. The state must already
+        have the move made on it.
+
+        A reduced move is first searched shallower with a null window, and only searched
+        to full depth if that does not show it to be no better than alpha.
+
+        :param state_depth: a tuple with a State and an int for the depth the move was made from
+        :param alpha: an int of the highest value the player who made the move is assured of
+        :param beta: an int of the lowest value the other player is assured of
         :param max_depth: an int of the max depth to search to
         :param heuristic_func: the heuristic function to use
-        :return: an int of the lowest value obtainable from next states
+        :param first_move: True if this is the first move searched from the state
+        :param reduction: an int of how much shallower to search the move at first
+        :return: an int of the value of the move
         """
-        if self.out_of_time():
-            raise OutOfTimeException
-        if state_depth[1] == max_depth:
-            return self.get_value(state_depth[0], heuristic_func)
+        next_state_depth = state_depth[0], state_depth[1] + 1
+        if reduction and not first_move:
+            self.reductions += 1
+            value = -self.negamax(next_state_depth, -alpha - self.NULL_WINDOW, -alpha, max_depth - reduction,
+                                  heuristic_func)
+            if value <= alpha or self._stop_event.is_set():
+                return value
+        if first_move or not self.use_pvs:
+            return -self.negamax(next_state_depth, -beta, -alpha, max_depth, heuristic_func)
+        value = -self.negamax(next_state_depth, -alpha - self.NULL_WINDOW, -alpha, max_depth, heuristic_func)
+        if alpha < value < beta and not self._stop_event.is_set():
+            self.re_searches += 1
+            value = -self.negamax(next_state_depth, -beta, -alpha, max_depth, heuristic_func)
+        return value
 
-        value = float('inf')
-        generator = StateSpaceGenerator(state_depth[0])
-        next_states = generator.generate_state_space()
+    def search_frontier(self, state, moves):
+        """
+        Returns the best of the given moves from a state one ply from the max depth,
+        scoring them all in one batched call instead of searching them one by one.
+        Only used without quiescence, where a move's value is its state's heuristic value.
 
-        for next_state in next_states:
-            next_state_depth = next_state, state_depth[1] + 1
-            value = min(value, self.max_value(next_state_depth, alpha, beta, max_depth, heuristic_func))
-            if value <= alpha:
-                self.pruned += 1
-                return value
-            beta = min(beta, value)
+        :param state: a State object
+        :param moves: a list of Moves from the state
+        :return: a tuple of the best value and its Move, or (-inf, None) without moves
+        """
+        if not moves:
+            return float('-inf'), None
+        self.nodes += len(moves)
+        self.batched_nodes += len(moves)
+        if self.nodes >= self._next_check:
+            self.check_limits()
+        scores = BatchEvaluator.evaluate_children(state, moves)
+        best_index = int(scores.argmin())
+        return -float(scores[best_index]), moves[best_index]
+
+    def order_late_moves(self, state, moves):
+        """
+        Yields the given moves from a state one ply from the max depth: the first as
+        generated, then, if it did not cut off, the rest best first by their scores
+        from one batched call. Like the generator, expects the state unchanged when resumed.
+
+        :param state: a State object
+        :param moves: an iterable of Moves from the state
+        :return: a generator of Moves
+        """
+        moves = iter(moves)
+        for move in moves:
+            yield move
+            break
+        late_moves = list(moves)
+        if late_moves:
+            self.batched_nodes += len(late_moves)
+            scores = BatchEvaluator.evaluate_children(state, late_moves)
+            for index in scores.argsort(kind="stable"):
+                yield late_moves[index]
+
+    def can_try_null_move(self, state, depth_left, alpha, beta, heuristic_func):
+        """
+        Checks whether passing the turn may be tried from the given state. Null moves are
+        only tried on null windows, with depth left to search after the reduction, when
+        the state already looks good enough to cut off, and while the player has enough
+        marbles that losing one more does not end the game.
+
+        :param state: a State object
+        :param depth_left: an int of the depth left to search below the state
+        :param alpha: an int of the highest value the player who has the turn is assured of
+        :param beta: an int of the lowest value the other player is assured of
+        :param heuristic_func: the heuristic function to use
+        :return: True if a null move may be tried, otherwise False
+        """
+        return (0 < self.null_move_reduction < depth_left
+                and beta - alpha <= self.NULL_WINDOW
+                and state.get_nodes_count_for_player(state.player) >= self.NULL_MOVE_MIN_MARBLES
+                and self.get_value(state, heuristic_func, alpha, beta) >= beta)
+
+    def get_reduction(self, move, move_count, depth_left, killers):
+        """
+        Returns how much shallower to search the given move: quiet moves that are not
+        killers are reduced once enough moves have been searched before them and enough
+        depth is left that the reduced search still searches a move.
+
+        :param move: a Move object
+        :param move_count: an int of how many moves were searched before this one
+        :param depth_left: an int of the depth left to search below the move's state
+        :param killers: a list of the killer move keys at the move's ply
+        :return: an int
+        """
+        if (move_count < self.lmr_moves or depth_left < self.lmr_reduction + 2
+                or move.move_type == MoveType.Push or move.move_type == MoveType.Scoring or move.key in killers):
+            return 0
+        return self.lmr_reduction
+
+    def record_cutoff(self, move, ply, depth_left):
+        """
+        Records that the given move caused a cutoff, making it a killer move at
+        this ply and raising its history score, unless it is a Push or Scoring move,
+        which are already searched early.
+
+        :param move: a Move object
+        :param ply: an int of the depth the move was played from
+        :param depth_left: an int of the depth searched below the move's state
+        :return: None
+        """
+        if move.move_type == MoveType.Push or move.move_type == MoveType.Scoring:
+            return
+        move_key = move.key
+        killers = self.killer_moves[ply]
+        if not killers or killers[0] != move_key:
+            self.killer_moves[ply] = [move_key] + killers[:1]
+        self.history[move_key] = self.history.get(move_key, 0) + depth_left * depth_left
+
+    def quiescence(self, state, alpha, beta, quiescence_depth, heuristic_func):
+        """
+        For the given state at the max depth, returns its value once the Push and
+        Scoring moves available from it have played out, from the perspective of
+        the player who has the turn. The player may always stand pat on the
+        heuristic value instead of pushing.
+
+        :param state: a State object
+        :param alpha: an int of the highest value the player who has the turn is assured of
+        :param beta: an int of the lowest value the other player is assured of
+        :param quiescence_depth: an int of how many more Push and Scoring moves to follow
+        :param heuristic_func: the heuristic function to use
+        :return: an int of the value of the state, meaningless once stopped
+        """
+        if self._stop_event.is_set():
+            return 0
+        value = self.get_value(state, heuristic_func, alpha, beta)
+        if value >= beta or quiescence_depth == 0:
+            return value
+        alpha = max(alpha, value)
+
+        for move in StateSpaceGenerator(state).generate_tactical_moves():
+            self.nodes += 1
+            if self.nodes >= self._next_check:
+                self.check_limits()
+            undo = state.make_move(move)
+            next_value = -self.quiescence(state, -beta, -alpha, quiescence_depth - 1, heuristic_func)
+            state.unmake_move(undo)
+            if self._stop_event.is_set():
+                return 0
+            if next_value > value:
+                value = next_value
+                if value >= beta:
+                    self.pruned += 1
+                    return value
+                alpha = max(alpha, value)
 
         return value
 
-    @staticmethod
-    def get_value(state, heuristic_func):
+    def store_value(self, state, depth_left, value, alpha, beta, best_move):
         """
-        Returns the estimated value of this state according to heuristic functions.
+        Stores a search result in the transposition table, classifying it against
+        the window it was searched with. The value and window are from the
+        perspective of the player who has the turn in the given state.
+
+        :param state: a State object
+        :param depth_left: an int of the depth searched below the state
+        :param value: the value found
+        :param alpha: the alpha the state was searched with
+        :param beta: the beta the state was searched with
+        :param best_move: the best Move found, or None
+        :return: None
+        """
+        if value <= alpha:
+            bound = Bound.UPPER
+        elif value >= beta:
+            bound = Bound.LOWER
+        else:
+            bound = Bound.EXACT
+        self.transposition_table.store(state.zobrist_hash, depth_left, value, bound,
+                                       best_move.key if best_move else None)
+
+    def get_value(self, state, heuristic_func, alpha=float('-inf'), beta=float('inf')):
+        """
+        Returns the estimated value of this state according to heuristic functions,
+        from the evaluation cache if it has one.
+
+        With lazy evaluation, the value may only be a bound once it is outside the window:
+        at most alpha when the value is, or at least beta when the value is. Bounds are
+        never cached, so the cache only ever answers with exact values.
 
         :param state: a State object
         :param heuristic_func: the function of the heuristic
+        :param alpha: an int of the highest value the player who has the turn is assured of
+        :param beta: an int of the lowest value the other player is assured of
         :return: an int of the value of this state
         """
-        # return heuristic-evaluated value of this state
+        cache = self.evaluation_cache
+        if cache is not None:
+            value = cache.probe(state, heuristic_func)
+            if value is not None:
+                return value
+        if self.lazy_evaluation and heuristic_func == Heuristics.evaluate:
+            value = Heuristics.evaluate_lazily(state, alpha, beta)
+            if cache is not None and alpha < value < beta:
+                cache.store(state, heuristic_func, value)
+            return value
         value = heuristic_func(state)
+        if cache is not None:
+            cache.store(state, heuristic_func, value)
         return value
 
 
-class OutOfTimeException(Exception):
-    pass
-
-
 if __name__ == "__main__":
-    from ai.heuristics import Heuristics
-
     # TEST: run algo with test input file
     search_algo = AlphaBeta(2)
 
@@ -231,18 +709,36 @@ if __name__ == "__main__":
     search_algo.start_new_search(
         FileProcessor.get_state_from_file("../dist/test_inputs/Test1.input"), heuristic)
     timer = perf_counter() - start
-    print(f"Time taken: {timer}, pruned: {search_algo.pruned}")
+    print(f"Time taken: {timer}, nodes: {search_algo.nodes}, nodes/s: {search_algo.nodes / timer:.0f}, "
+          f"pruned: {search_algo.pruned}, "
+          f"table hits: {search_algo.transposition_table.hits}/{search_algo.transposition_table.probes}, "
+          f"aspiration fails: {search_algo.fail_lows} low, {search_algo.fail_highs} high "
+          f"in {search_algo.aspiration_searches} searches, null move cutoffs: {search_algo.null_cutoffs}, "
+          f"reductions: {search_algo.reductions}, eval cache hits: {search_algo.evaluation_cache.hits}/"
+          f"{search_algo.evaluation_cache.hits + search_algo.evaluation_cache.misses}")
 
     print("\nTest2.input")
     start = perf_counter()  # TEST: start timer
     search_algo.start_new_search(
         FileProcessor.get_state_from_file("../dist/test_inputs/Test2.input"), heuristic)
     timer = perf_counter() - start
-    print(f"Time taken: {timer}, pruned: {search_algo.pruned}")
+    print(f"Time taken: {timer}, nodes: {search_algo.nodes}, nodes/s: {search_algo.nodes / timer:.0f}, "
+          f"pruned: {search_algo.pruned}, "
+          f"table hits: {search_algo.transposition_table.hits}/{search_algo.transposition_table.probes}, "
+          f"aspiration fails: {search_algo.fail_lows} low, {search_algo.fail_highs} high "
+          f"in {search_algo.aspiration_searches} searches, null move cutoffs: {search_algo.null_cutoffs}, "
+          f"reductions: {search_algo.reductions}, eval cache hits: {search_algo.evaluation_cache.hits}/"
+          f"{search_algo.evaluation_cache.hits + search_algo.evaluation_cache.misses}")
 
     print("\nTest3.input")
     start = perf_counter()  # TEST: start timer
     search_algo.start_new_search(
         FileProcessor.get_state_from_file("../dist/test_inputs/Test3.input"), heuristic)
     timer = perf_counter() - start
-    print(f"Time taken: {timer}, pruned: {search_algo.pruned}")
+    print(f"Time taken: {timer}, nodes: {search_algo.nodes}, nodes/s: {search_algo.nodes / timer:.0f}, "
+          f"pruned: {search_algo.pruned}, "
+          f"table hits: {search_algo.transposition_table.hits}/{search_algo.transposition_table.probes}, "
+          f"aspiration fails: {search_algo.fail_lows} low, {search_algo.fail_highs} high "
+          f"in {search_algo.aspiration_searches} searches, null move cutoffs: {search_algo.null_cutoffs}, "
+          f"reductions: {search_algo.reductions}, eval cache hits: {search_algo.evaluation_cache.hits}/"
+          f"{search_algo.evaluation_cache.hits + search_algo.evaluation_cache.misses}")
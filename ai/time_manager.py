@@ -0,0 +1,148 @@
+"""
+This module houses the TimeManager class, which decides how long the AI
+searches each move within the game's time and move limits.
+"""
+import os
+import sys
+
+sys.path.append(os.path.realpath('..'))
+from time import perf_counter
+from state_space_gen.state_space_generator import StateSpaceGenerator
+
+
+class TimeManager:
+    """
+    Spends the per-move time limit from the game's Settings. Each search may
+    run up to the limit, but stops deepening at a softer target that depends on
+    the game phase and on how often the best move has changed between depths.
+    Forced moves and opening book moves are played without searching.
+    """
+
+    # Seconds to search each move when the player has no time limit
+    DEFAULT_MOVE_TIME = 5
+    # Seconds kept back from the time limit for applying the move and redrawing
+    SAFETY_MARGIN = 0.5
+    # Turns each player plays before the middlegame, when positions are still well known
+    OPENING_TURNS = 5
+    # Marbles a player is down to, or turns left before the move limit, for the endgame to begin
+    ENDGAME_MARBLES = 10
+    ENDGAME_TURNS = 5
+    # Share of the time limit to aim for in each phase
+    PHASE_FACTORS = {"opening": 0.4, "middlegame": 0.7, "endgame": 1.0}
+    # Depths the best move must stay the same for to count as stable, and how the target scales with it
+    STABLE_DEPTHS = 2
+    STABLE_FACTOR = 0.5
+    UNSTABLE_FACTOR = 1.5
+    # A new depth is only started before this share of the target, as it takes several times longer
+    NEXT_DEPTH_SHARE = 0.4
+
+    def __init__(self, book=None):
+        """
+        Initializes a TimeManager object.
+
+        :param book: a function taking a State and returning a Move to play without searching or None,
+                     or None for no opening book
+        """
+        self.book = book
+        self._target_time = None
+        # performance trackers
+        self.instant_moves = 0
+
+    def get_time_limit(self, settings, player):
+        """
+        Returns the most time to search for a move for the given player.
+
+        :param settings: a Settings object
+        :param player: an int equal to 1 or 2
+        :return: a number of seconds
+        """
+        time_limit = settings.time_limit_p1 if player == 1 else settings.time_limit_p2
+        if not time_limit:
+            return self.DEFAULT_MOVE_TIME
+        return max(time_limit - self.SAFETY_MARGIN, time_limit / 2)
+
+    def get_phase(self, game):
+        """
+        Returns the phase of the given game: "opening", "middlegame" or "endgame".
+
+        :param game: a Game object
+        :return: a string
+        """
+        turn = (game.turn_counter + 1) // 2
+        move_limit = game.settings.move_limit
+        fewest_marbles = min(game.state.get_nodes_count_for_player(1), game.state.get_nodes_count_for_player(2))
+        if fewest_marbles <= self.ENDGAME_MARBLES or (move_limit and move_limit - turn < self.ENDGAME_TURNS):
+            return "endgame"
+        if turn <= self.OPENING_TURNS:
+            return "opening"
+        return "middlegame"
+
+    def get_move_times(self, game):
+        """
+        Returns the most time to search for a move in the given game, and the time
+        to aim for before the best move's stability is taken into account.
+
+        :param game: a Game object
+        :return: a tuple of two numbers of seconds (time limit, target time)
+        """
+        time_limit = self.get_time_limit(game.settings, game.state.player)
+        return time_limit, time_limit * self.PHASE_FACTORS[self.get_phase(game)]
+
+    def choose_move(self, search, game, heuristic_func):
+        """
+        Returns the move to play in the given game, searching within its limits.
+
+        :param search: an AlphaBeta object
+        :param game: a Game object
+        :param heuristic_func: the heuristic function to use
+        :return: a Move object, or None if there are no legal moves
+        """
+        state = game.state
+        moves = StateSpaceGenerator(state).generate_all_valid_moves()
+        book_move = self.book(state) if self.book is not None else None
+        if len(moves) <= 1 or book_move is not None:
+            self.instant_moves += 1
+            return book_move or (moves[0] if moves else None)
+
+        time_limit, self._target_time = self.get_move_times(game)
+        search.max_time = time_limit
+        search.depth_callback = self.should_deepen
+        try:
+            return search.start_new_search(state, heuristic_func, moves)
+        finally:
+            search.depth_callback = None
+
+    def should_deepen(self, search):
+        """
+        Returns whether the given search should start another depth. The target time
+        shrinks while the best move stays the same and grows while it keeps changing.
+
+        :param search: an AlphaBeta object that has just finished a depth
+        :return: a bool
+        """
+        recent_moves = [move.key for move, _ in search.completed_depths[-self.STABLE_DEPTHS - 1:]]
+        if len(recent_moves) > self.STABLE_DEPTHS and len(set(recent_moves)) == 1:
+            target_time = self._target_time * self.STABLE_FACTOR
+        elif len(recent_moves) > 1 and recent_moves[-1] != recent_moves[-2]:
+            target_time = min(self._target_time * self.UNSTABLE_FACTOR, search.max_time)
+        else:
+            target_time = self._target_time
+        return perf_counter() - search.start_time < target_time * self.NEXT_DEPTH_SHARE
+
+
+if __name__ == "__main__":
+    from ai.heuristics import Heuristics
+    from ai.search import AlphaBeta
+    from core.game import Game
+    from gui.settings import Settings
+
+    # TEST: time the AI's first few moves with a 10 second limit per move
+    test_game = Game(Settings(1, 1, 3, 0, 10, 10))
+    time_manager = TimeManager()
+    search_algo = AlphaBeta()
+    for _ in range(4):
+        start = perf_counter()
+        ai_move = time_manager.choose_move(search_algo, test_game, Heuristics.evaluate)
+        print(f"{ai_move} in {perf_counter() - start:.2f}s after {len(search_algo.completed_depths)} depths, "
+              f"phase {time_manager.get_phase(test_game)}")
+        test_game.apply_move(ai_move)
@@ -0,0 +1,294 @@
+"""
+This module houses the TranspositionTable class, which stores search
+results by Zobrist hash so positions reached through different move
+orders are only searched once.
+
+SharedTranspositionTable keeps the same buckets in a shared memory block
+so several processes can search with one table.
+"""
+import struct
+from collections import namedtuple
+from enum import Enum
+from multiprocessing import shared_memory
+
+TableEntry = namedtuple("TableEntry", "key depth value bound move_key age")
+
+
+class Bound(Enum):
+    """
+    Enumeration of what a stored value says about the true value of a position.
+    """
+    EXACT = 0  # the search finished inside the window
+    LOWER = 1  # the search failed high, the true value is at least this
+    UPPER = 2  # the search failed low, the true value is at most this
+
+
+class TranspositionTable:
+    """
+    A fixed-size hash table of search results. Each bucket has two slots: a
+    depth-preferred slot that keeps the deepest result from the current search,
+    and an always-replace slot that takes everything else.
+
+    Values are stored from the perspective of the player who has the turn.
+    """
+
+    # Estimated bytes used by one stored TableEntry and its contents
+    ENTRY_SIZE = 200
+
+    def __init__(self, size_mb=16):
+        """
+        Initializes a TranspositionTable object.
+
+        :param size_mb: an int of the memory budget in megabytes
+        """
+        bucket_count = 1
+        while bucket_count * 4 * self.ENTRY_SIZE <= size_mb * 2 ** 20:
+            bucket_count *= 2
+        self._mask = bucket_count - 1
+        self._depth_slots = [None] * bucket_count
+        self._recent_slots = [None] * bucket_count
+        self._age = 0
+        # performance trackers
+        self.probes = 0
+        self.hits = 0
+
+    def __len__(self):
+        """
+        Returns the number of buckets in this table.
+
+        :return: an int
+        """
+        return self._mask + 1
+
+    def new_search(self):
+        """
+        Marks the start of a new search so older entries lose their place
+        in the depth-preferred slots.
+
+        :return: None
+        """
+        self._age += 1
+        self.probes = 0
+        self.hits = 0
+
+    def clear(self):
+        """
+        Removes all entries from this table.
+
+        :return: None
+        """
+        self._depth_slots = [None] * len(self)
+        self._recent_slots = [None] * len(self)
+
+    def probe(self, key):
+        """
+        Returns the entry stored for the given hash, if any.
+
+        :param key: an int Zobrist hash
+        :return: a TableEntry or None
+        """
+        self.probes += 1
+        index = key & self._mask
+        entry = self._depth_slots[index]
+        if entry is None or entry.key != key:
+            entry = self._recent_slots[index]
+            if entry is None or entry.key != key:
+                return None
+        self.hits += 1
+        return entry
+
+    def store(self, key, depth, value, bound, move_key):
+        """
+        Stores a search result for the given hash.
+
+        :param key: an int Zobrist hash
+        :param depth: an int of the depth searched below the position
+        :param value: the value found, from the perspective of the player who has the turn
+        :param bound: a Bound enum object
+        :param move_key: the key of the best move found, or None
+        :return: None
+        """
+        index = key & self._mask
+        entry = TableEntry(key, depth, value, bound, move_key, self._age)
+        kept = self._depth_slots[index]
+        if kept is None or kept.key == key or kept.age != self._age or depth >= kept.depth:
+            if kept is not None and kept.key != key:
+                self._recent_slots[index] = kept
+            self._depth_slots[index] = entry
+        else:
+            self._recent_slots[index] = entry
+
+
+class SharedTranspositionTable(TranspositionTable):
+    """
+    A TranspositionTable whose buckets live in a multiprocessing shared memory
+    block, so every process searching with it reads and writes the same entries.
+
+    Entries are packed into three 64 bit words: the key XORed with the other two,
+    the move key, depth, bound, age and a set bit, and the value's float bits. Writes take no
+    lock; an entry torn by two processes writing at once no longer XORs back to
+    its key and is read as missing.
+
+    The process that creates the table owns it: only the owner clears the table,
+    starts new searches and frees the block. Other processes attach to it by
+    name, which happens when the table is pickled to them.
+    """
+
+    # Bytes of one packed entry, and of the header holding the shared age
+    ENTRY_SIZE = 24
+    HEADER_SIZE = 64
+
+    _ENTRY = struct.Struct("<QQQ")
+    _AGE = struct.Struct("<Q")
+    _FLOAT = struct.Struct("<d")
+    _FLOAT_BITS = struct.Struct("<Q")
+    _BOUNDS = list(Bound)
+    _SET_BIT = 1 << 35
+
+    def __init__(self, size_mb=16, name=None):
+        """
+        Initializes a SharedTranspositionTable object, creating a new block or
+        attaching to an existing one.
+
+        :param size_mb: an int of the block's size in megabytes, unused when attaching
+        :param name: a string of the name of the block to attach to, or None to create one
+        """
+        self._owner = name is None
+        if self._owner:
+            bucket_count = 1
+            while bucket_count * 4 * self.ENTRY_SIZE <= size_mb * 2 ** 20:
+                bucket_count *= 2
+            self._memory = shared_memory.SharedMemory(create=True,
+                                                      size=self.HEADER_SIZE + bucket_count * 2 * self.ENTRY_SIZE)
+            self._memory.buf[:self._memory.size] = bytes(self._memory.size)
+        else:
+            self._memory = shared_memory.SharedMemory(name)
+            bucket_count = (self._memory.size - self.HEADER_SIZE) // (2 * self.ENTRY_SIZE)
+        self._mask = bucket_count - 1
+        # performance trackers, counted separately in each process
+        self.probes = 0
+        self.hits = 0
+
+    def __reduce__(self):
+        """
+        Pickles this table as its block's name, so unpickling attaches to the block.
+
+        :return: a tuple
+        """
+        return SharedTranspositionTable, (0, self.name)
+
+    @property
+    def name(self):
+        """
+        Returns the name of this table's shared memory block.
+
+        :return: a string
+        """
+        return self._memory.name
+
+    @property
+    def _age(self):
+        """
+        Returns the age of the current search, shared by every process.
+
+        :return: an int
+        """
+        return self._AGE.unpack_from(self._memory.buf, 0)[0]
+
+    def new_search(self):
+        """
+        Marks the start of a new search so older entries lose their place
+        in the depth-preferred slots. Only the owner ages the table.
+
+        :return: None
+        """
+        if self._owner:
+            self._AGE.pack_into(self._memory.buf, 0, (self._age + 1) & 0xFF)
+        self.probes = 0
+        self.hits = 0
+
+    def clear(self):
+        """
+        Removes all entries from this table, if this process owns it.
+
+        :return: None
+        """
+        if self._owner:
+            self._memory.buf[self.HEADER_SIZE:self._memory.size] = bytes(self._memory.size - self.HEADER_SIZE)
+
+    def close(self):
+        """
+        Detaches this process from the table, and frees the block if this process owns it.
+
+        :return: None
+        """
+        self._memory.close()
+        if self._owner:
+            self._memory.unlink()
+
+    def _read(self, offset, key):
+        """
+        Returns the entry at the given offset if it holds the given key.
+
+        :param offset: an int of the entry's offset in the block
+        :param key: an int Zobrist hash
+        :return: a TableEntry or None
+        """
+        check, data, value_bits = self._ENTRY.unpack_from(self._memory.buf, offset)
+        if check ^ data ^ value_bits != key or not data & self._SET_BIT:
+            return None
+        move_key = (data & 0x1FFFF) - 1
+        return TableEntry(key, (data >> 17) & 0xFF, self._FLOAT.unpack(self._FLOAT_BITS.pack(value_bits))[0],
+                          self._BOUNDS[(data >> 25) & 0x3], move_key if move_key >= 0 else None, (data >> 27) & 0xFF)
+
+    def _write(self, offset, entry):
+        """
+        Packs the given entry into the block at the given offset.
+
+        :param offset: an int of the entry's offset in the block
+        :param entry: a TableEntry
+        :return: None
+        """
+        data = ((entry.move_key + 1 if entry.move_key is not None else 0)
+                | min(entry.depth, 0xFF) << 17 | entry.bound.value << 25 | entry.age << 27 | self._SET_BIT)
+        value_bits = self._FLOAT_BITS.unpack(self._FLOAT.pack(entry.value))[0]
+        self._ENTRY.pack_into(self._memory.buf, offset, entry.key ^ data ^ value_bits, data, value_bits)
+
+    def probe(self, key):
+        """
+        Returns the entry stored for the given hash, if any.
+
+        :param key: an int Zobrist hash
+        :return: a TableEntry or None
+        """
+        self.probes += 1
+        offset = self.HEADER_SIZE + (key & self._mask) * 2 * self.ENTRY_SIZE
+        entry = self._read(offset, key) or self._read(offset + self.ENTRY_SIZE, key)
+        if entry is not None:
+            self.hits += 1
+        return entry
+
+    def store(self, key, depth, value, bound, move_key):
+        """
+        Stores a search result for the given hash.
+
+        :param key: an int Zobrist hash
+        :param depth: an int of the depth searched below the position
+        :param value: the value found, from the perspective of the player who has the turn
+        :param bound: a Bound enum object
+        :param move_key: the key of the best move found, or None
+        :return: None
+        """
+        offset = self.HEADER_SIZE + (key & self._mask) * 2 * self.ENTRY_SIZE
+        age = self._age
+        entry = TableEntry(key, depth, value, bound, move_key, age)
+        check, data, value_bits = self._ENTRY.unpack_from(self._memory.buf, offset)
+        kept_key = check ^ data ^ value_bits
+        kept = data & self._SET_BIT
+        if not kept or kept_key == key or (data >> 27) & 0xFF != age or depth >= (data >> 17) & 0xFF:
+            if kept and kept_key != key:
+                self._memory.buf[offset + self.ENTRY_SIZE:offset + 2 * self.ENTRY_SIZE] = \
+                    self._memory.buf[offset:offset + self.ENTRY_SIZE]
+            self._write(offset, entry)
+        else:
+            self._write(offset + self.ENTRY_SIZE, entry)
@@ -22,6 +22,7 @@ class Game:
         self.state = State.get_start_state(layout_arrays.STARTING_LAYOUT[settings.layout])
         self.last_state = self.state
         self.turn_counter = 1
+        self.move_listeners = []  # functions given this Game and the Move after each move is applied
 
     def start_game(self):
         pass
@@ -36,6 +37,8 @@ class Game:
         self.last_state = self.state
         self.state = self.state.apply_move(move)
         self.turn_counter += 1
+        for listener in self.move_listeners:
+            listener(self, move)
 
     def is_game_over(self):
         if self.state.get_nodes_count_for_player(1) == 8:
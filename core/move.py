@@ -4,6 +4,7 @@ This module houses the Move and ChangeMatrix classes.
 from enum import Enum
 
 from core.node import NodeValue
+from layouts.board_tables import CELL_COORDS, CELL_INDEX, CELL_BITS, ZOBRIST_KEYS
 
 
 class Move:
@@ -59,6 +60,19 @@ class Move:
         """
         self._move_type = new_move_type
 
+    @property
+    def key(self):
+        """
+        Returns an int identifying this Move's marbles and direction, which stays
+        the same when the move is generated again: the start cell, the end cell
+        and the direction's clock position packed into 16 bits.
+
+        :return: an int
+        """
+        return CELL_INDEX[self.start_node.row][self.start_node.column] << 10 \
+            | CELL_INDEX[self.end_node.row][self.end_node.column] << 4 \
+            | self.direction.value[1]
+
     @property
     def change_matrix(self):
         """
@@ -98,8 +112,10 @@ class Move:
 
 class ChangeMatrix:
     """
-    A 2d array of all NodeValue.INVALIDs except for spaces that are modified as a result of
-    a Move. This matrix is used to produce the resulting board after a Move.
+    Records the spaces that are modified as a result of a Move as a list of
+    (cell, old value, new value) changes, which is used to produce the resulting
+    board after a Move. The 2d array form, with all NodeValue.INVALIDs except for
+    the modified spaces, is only built when requested.
     """
 
     def __init__(self, moving_player, original_positions, new_positions, pushed_nodes=None):
@@ -111,41 +127,125 @@ class ChangeMatrix:
         :param new_positions: a list of nodes at post-move locations
         :param pushed_nodes: a list of nodes at locations after being pushed
         """
-        self._matrix = self.generate_change_matrix_from_nodes(moving_player, original_positions,
-                                                              new_positions, pushed_nodes)
+        self._changes = self.generate_changes_from_nodes(moving_player, original_positions,
+                                                         new_positions, pushed_nodes)
+        self._masks = self.generate_masks_from_changes(self._changes)
+        self._zobrist_delta = self.generate_zobrist_delta_from_changes(self._changes)
+        self._matrix = None
+
+    @classmethod
+    def from_changes(cls, changes):
+        """
+        Returns a ChangeMatrix object for the given changes.
+
+        :param changes: a tuple of (cell, old value, new value) tuples of ints
+        :return: a ChangeMatrix object
+        """
+        change_matrix = cls.__new__(cls)
+        change_matrix._changes = changes
+        change_matrix._masks = cls.generate_masks_from_changes(changes)
+        change_matrix._zobrist_delta = cls.generate_zobrist_delta_from_changes(changes)
+        change_matrix._matrix = None
+        return change_matrix
 
     @staticmethod
-    def generate_change_matrix_from_nodes(moving_player, original_positions, new_positions, pushed_nodes=None):
+    def generate_changes_from_nodes(moving_player, original_positions, new_positions, pushed_nodes=None):
         """
-        Returns a change matrix by setting all original positions to NodeValue.Empty, all
+        Returns the changes made by setting all original positions to NodeValue.Empty, all
         new positions to the moving player's corresponding NodeValue, and all pushed nodes'
-        ending positions to the opposing player's NodeValue.
+        ending positions to the opposing player's NodeValue. Spaces that end up with the
+        value they started with are left out.
 
         :param moving_player: an int equal to 1 or 2
         :param original_positions: a list of nodes at pre-move locations
         :param new_positions: a list of nodes at post-move locations
         :param pushed_nodes: a list of nodes at locations after being pushed
-        :return: a 2d array of NodeValues
+        :return: a tuple of (cell, old value, new value) tuples of ints
         """
         moving_player_value = NodeValue.get_node_value_from_num(moving_player)
         other_player_value = NodeValue.WHITE if moving_player_value == NodeValue.BLACK else NodeValue.BLACK
-        change_matrix = [[NodeValue.INVALID for col in range(11)] for row in range(11)]
-        for node in original_positions:
-            change_matrix[node.row][node.column] = NodeValue.EMPTY
-        for node in new_positions:
-            change_matrix[node.row][node.column] = moving_player_value
-        if pushed_nodes:
-            for node in pushed_nodes:
-                change_matrix[node.row][node.column] = other_player_value
-        return change_matrix
+        old_values, new_values = {}, {}
+        for nodes, new_value in ((original_positions, NodeValue.EMPTY),
+                                 (new_positions, moving_player_value),
+                                 (pushed_nodes or [], other_player_value)):
+            for node in nodes:
+                cell = CELL_INDEX[node.row][node.column]
+                old_values.setdefault(cell, node.node_value)
+                new_values[cell] = new_value
+        return tuple((cell, old_values[cell].value, new_value.value)
+                     for cell, new_value in new_values.items() if new_value != old_values[cell])
+
+    @staticmethod
+    def generate_masks_from_changes(changes):
+        """
+        Returns the bitboard masks of the given changes: every changed cell, the cells
+        that become player 1's and the cells that become player 2's.
+
+        :param changes: a tuple of (cell, old value, new value) tuples of ints
+        :return: a tuple of three ints (changed, black, white)
+        """
+        changed, black, white = 0, 0, 0
+        for cell, _, new_value in changes:
+            changed |= CELL_BITS[cell]
+            if new_value == NodeValue.BLACK.value:
+                black |= CELL_BITS[cell]
+            elif new_value == NodeValue.WHITE.value:
+                white |= CELL_BITS[cell]
+        return changed, black, white
+
+    @staticmethod
+    def generate_zobrist_delta_from_changes(changes):
+        """
+        Returns the value to XOR into a state's Zobrist hash to apply the given changes.
+
+        :param changes: a tuple of (cell, old value, new value) tuples of ints
+        :return: an int
+        """
+        delta = 0
+        for cell, old_value, new_value in changes:
+            delta ^= ZOBRIST_KEYS[cell][old_value] ^ ZOBRIST_KEYS[cell][new_value]
+        return delta
+
+    @property
+    def changes(self):
+        """
+        Returns the changes made to the board.
+
+        :return: a tuple of (cell, old value, new value) tuples of ints
+        """
+        return self._changes
+
+    @property
+    def masks(self):
+        """
+        Returns the bitboard masks of this change: every changed cell, the cells
+        that become player 1's and the cells that become player 2's.
+
+        :return: a tuple of three ints (changed, black, white)
+        """
+        return self._masks
+
+    @property
+    def zobrist_delta(self):
+        """
+        Returns the value to XOR into a state's Zobrist hash to apply this change.
+
+        :return: an int
+        """
+        return self._zobrist_delta
 
     @property
     def matrix(self):
         """
-        Returns the change matrix.
+        Returns the change matrix, building it from the changes if needed.
 
-        :return: a 2d array of ints
+        :return: a 2d array of NodeValues
         """
+        if self._matrix is None:
+            self._matrix = [[NodeValue.INVALID for col in range(11)] for row in range(11)]
+            for cell, _, new_value in self._changes:
+                row, column = CELL_COORDS[cell]
+                self._matrix[row][column] = NodeValue.get_node_value_from_num(new_value)
         return self._matrix
 
 
@@ -182,6 +282,18 @@ class Direction(Enum):
         """
         return {Direction.L, Direction.TL, Direction.BL}
 
+    @staticmethod
+    def get_direction_from_clock(clock):
+        """
+        Returns the Direction enum corresponding to the given clock position.
+
+        :param clock: an int, one of 1, 3, 5, 7, 9 or 11
+        :return: a Direction enum object, or None if there is none
+        """
+        for direction in Direction:
+            if direction.value[1] == clock:
+                return direction
+
 
 if __name__ == "__main__":
     print(f"{MoveType.Inline.value[0]}")
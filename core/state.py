@@ -1,28 +1,63 @@
 """
 This module houses the State class.
 """
-from copy import deepcopy
-
-from core.move import MoveType
 from core.node import Node, NodeValue
 from layouts import layout_arrays
+from layouts.board_tables import CELL_COORDS, CELL_INDEX, CELL_BITS, CENTER_VALUES, ZOBRIST_KEYS, \
+    ZOBRIST_PLAYER_2_KEY, count_adjacent_pairs, get_cells_from_bitboard, get_bitboards_from_layout
+
+# +1 for player 1's marbles and -1 for player 2's, indexed by NodeValue
+PLAYER_SIGNS = (0, 1, -1, 0)
 
 
 class State:
     """
     Represents a snapshot of the game which contains a game board,
     the player who has the turn, and the game score for each player.
+
+    The board is stored as two bitboards (one per player) over the 61 playable
+    cells numbered in layouts.board_tables. The 11x11 array of Nodes returned by
+    board and get_node is a view built from the bitboards when first requested.
+
+    States compare equal when they have the same player and marbles, and hash to
+    a Zobrist hash that make_move updates from each move's changes. The terms the
+    heuristics evaluate are kept the same way, once first requested.
     """
 
-    def __init__(self, current_player, board):
+    def __init__(self, current_player, board=None):
         """
         Initializes a State object.
 
         :param current_player: an int equal to 1 or 2
-        :param board: a 2D array of Nodes
+        :param board: a 2D array of Nodes, or None for an empty board
         """
         self._player = current_player
-        self._board = board  # 2d array of Nodes
+        self._black = 0  # bitboard of player 1's marbles
+        self._white = 0  # bitboard of player 2's marbles
+        self._board = None  # 2d array of Nodes, built on demand
+        self._hash = self.get_zobrist_hash(current_player, 0, 0)
+        self._eval_terms = None  # see eval_terms, computed on demand
+        if board is not None:
+            self.board = board
+
+    def __eq__(self, other):
+        """
+        Returns whether the other state has the same player and marbles as this one.
+
+        :param other: an object
+        :return: a bool
+        """
+        if not isinstance(other, State):
+            return NotImplemented
+        return self._player == other._player and self._black == other._black and self._white == other._white
+
+    def __hash__(self):
+        """
+        Returns the Zobrist hash of this state.
+
+        :return: an int
+        """
+        return self._hash
 
     def __repr__(self):
         """
@@ -31,7 +66,7 @@ class State:
         :return: the state's information as a string
         """
         node_str = ""
-        for row in self._board:
+        for row in self.board:
             for column in row:
                 node_str = ' '.join((node_str, f"{column.node_value.value} "))
             node_str = ''.join((node_str, "\n"))
@@ -58,7 +93,54 @@ class State:
         :param start_layout: the 2d array of the starting layout
         :return: a State object
         """
-        return State(1, State.get_board_from_nodes(Node.get_start_nodes(start_layout)))
+        return State.from_bitboards(1, *get_bitboards_from_layout(start_layout))
+
+    @staticmethod
+    def from_bitboards(current_player, black, white):
+        """
+        Returns a State object for the given player and bitboards.
+
+        :param current_player: an int equal to 1 or 2
+        :param black: an int bitboard of player 1's marbles
+        :param white: an int bitboard of player 2's marbles
+        :return: a State object
+        """
+        state = State(current_player)
+        state._black = black
+        state._white = white
+        state._hash = State.get_zobrist_hash(current_player, black, white)
+        return state
+
+    @staticmethod
+    def get_zobrist_hash(player, black, white):
+        """
+        Returns the Zobrist hash of the given player and bitboards, computed from scratch.
+
+        :param player: an int equal to 1 or 2
+        :param black: an int bitboard of player 1's marbles
+        :param white: an int bitboard of player 2's marbles
+        :return: an int
+        """
+        zobrist_hash = ZOBRIST_PLAYER_2_KEY if player == 2 else 0
+        for cell in get_cells_from_bitboard(black):
+            zobrist_hash ^= ZOBRIST_KEYS[cell][NodeValue.BLACK.value]
+        for cell in get_cells_from_bitboard(white):
+            zobrist_hash ^= ZOBRIST_KEYS[cell][NodeValue.WHITE.value]
+        return zobrist_hash
+
+    @staticmethod
+    def get_eval_terms(black, white):
+        """
+        Returns the evaluation terms of the given bitboards, computed from scratch.
+
+        :param black: an int bitboard of player 1's marbles
+        :param white: an int bitboard of player 2's marbles
+        :return: a tuple as returned by eval_terms
+        """
+        centering = sum(CENTER_VALUES[cell] for cell in get_cells_from_bitboard(black)) - \
+            sum(CENTER_VALUES[cell] for cell in get_cells_from_bitboard(white))
+        return (centering, count_adjacent_pairs(black) - count_adjacent_pairs(white),
+                black.bit_count(), white.bit_count())
 
     @staticmethod
     def get_board_from_nodes(nodes):
@@ -96,15 +178,59 @@ class State:
 
         :param value: an int equal to 1 or 2
         """
+        if value != self._player:
+            self._hash ^= ZOBRIST_PLAYER_2_KEY
         self._player = value
 
+    @property
+    def zobrist_hash(self):
+        """
+        Returns the Zobrist hash of this state.
+
+        :return: an int
+        """
+        return self._hash
+
+    @property
+    def eval_terms(self):
+        """
+        Returns the terms the heuristics evaluate this state by: the sum of CENTER_VALUES
+        over player 1's marbles less player 2's, the number of pairs of adjacent player 1
+        marbles less player 2's, and each player's number of marbles.
+
+        :return: a tuple of (float, int, int, int)
+        """
+        if self._eval_terms is None:
+            self._eval_terms = self.get_eval_terms(self._black, self._white)
+        return self._eval_terms
+
+    @property
+    def black(self):
+        """
+        Returns the bitboard of player 1's marbles.
+
+        :return: an int
+        """
+        return self._black
+
+    @property
+    def white(self):
+        """
+        Returns the bitboard of player 2's marbles.
+
+        :return: an int
+        """
+        return self._white
+
     @property
     def board(self):
         """
-        Returns the board.
+        Returns the board, building it from the bitboards if needed.
 
         :return: a 2d array of Nodes
         """
+        if self._board is None:
+            self._board = self.copy_current_board()
         return self._board
 
     @board.setter
@@ -114,7 +240,18 @@ class State:
 
         :param new_board: a 2d array of Nodes
         """
-        self._board = new_board
+        black, white = 0, 0
+        for cell, (row, column) in enumerate(CELL_COORDS):
+            node_value = new_board[row][column].node_value
+            if node_value == NodeValue.BLACK:
+                black |= CELL_BITS[cell]
+            elif node_value == NodeValue.WHITE:
+                white |= CELL_BITS[cell]
+        self._black = black
+        self._white = white
+        self._hash = self.get_zobrist_hash(self._player, black, white)
+        self._board = None
+        self._eval_terms = None
 
     # @property
     # def scores(self):
@@ -128,7 +265,16 @@ class State:
         :param column: an int
         :return: a Node
         """
-        return self._board[row][column]
+        return self.board[row][column]
+
+    def get_bitboard_for_player(self, player):
+        """
+        Returns the bitboard of the specified player's marbles.
+
+        :param player: an int equal to 1 or 2
+        :return: an int
+        """
+        return self._black if player == 1 else self._white
 
     def get_all_nodes_for_player(self, player):
         """
@@ -137,7 +283,9 @@ class State:
         :param player: an int equal to 1 or 2
         :return: a set of Nodes
         """
-        return {node for row in self._board for node in row if node.node_value.value == player}
+        board = self.board
+        return {board[CELL_COORDS[cell][0]][CELL_COORDS[cell][1]]
+                for cell in get_cells_from_bitboard(self.get_bitboard_for_player(player))}
 
     def get_nodes_count_for_player(self, player):
         """
@@ -146,7 +294,7 @@ class State:
         :param player: an int equal to 1 or 2
         :return: an int
         """
-        return len(self.get_all_nodes_for_player(player))
+        return self.get_bitboard_for_player(player).bit_count()
 
     def get_node_in_direction_of_node(self, node, direction):
         """
@@ -180,18 +328,84 @@ class State:
         :param move: a Move object
         :return: a new State object
         """
-        next_player = self.get_other_player_num(self.player)
-        new_state = State(next_player, self.copy_current_board())
-        # if move.move_type == MoveType.Scoring:
-        #     new_state.scores[self.player - 1] += 1
-        for row in new_state.board:
-            for node in row:
-                if node.node_value.value:  # if not NodeValue.INVALID
-                    new_val = move.change_matrix.matrix[node.row][node.column]
-                    if new_val.value:
-                        new_state.board[node.row][node.column].node_value = new_val
+        new_state = self.copy()
+        new_state.make_move(move)
         return new_state
 
+    def make_move(self, move):
+        """
+        Applies the given move to this state in place and passes the turn.
+
+        :param move: a Move object generated from this state
+        :return: an undo record to pass to unmake_move
+        """
+        undo = self._player, self._black, self._white, self._hash, self._board, self._eval_terms
+        changed, black, white = move.change_matrix.masks
+        black = (self._black & ~changed) | black
+        white = (self._white & ~changed) | white
+        if self._eval_terms is not None:
+            self._eval_terms = self.update_eval_terms(move.change_matrix.changes, changed, black, white)
+        self._black = black
+        self._white = white
+        self._player = self.get_other_player_num(self._player)
+        self._hash ^= move.change_matrix.zobrist_delta ^ ZOBRIST_PLAYER_2_KEY
+        self._board = None
+        return undo
+
+    def make_null_move(self):
+        """
+        Passes the turn without moving, in place. Only the search uses this, as
+        passing is not a legal move.
+
+        :return: an undo record to pass to unmake_move
+        """
+        undo = self._player, self._black, self._white, self._hash, self._board, self._eval_terms
+        self.player = self.get_other_player_num(self._player)
+        return undo
+
+    def unmake_move(self, undo):
+        """
+        Restores this state to how it was before the move that produced the given
+        undo record. Moves must be unmade in the reverse order they were made.
+
+        :param undo: an undo record returned by make_move
+        :return: None
+        """
+        self._player, self._black, self._white, self._hash, self._board, self._eval_terms = undo
+
+    def update_eval_terms(self, changes, changed, black, white):
+        """
+        Returns this state's evaluation terms after a move, updated from the cells the
+        move changes rather than computed from scratch.
+
+        :param changes: a tuple of the move's (cell, old value, new value) tuples of ints
+        :param changed: an int bitboard of the cells the move changes
+        :param black: an int bitboard of player 1's marbles after the move
+        :param white: an int bitboard of player 2's marbles after the move
+        :return: a tuple as returned by eval_terms
+        """
+        centering, pairs, black_count, white_count = self._eval_terms
+        for cell, old_value, new_value in changes:
+            centering += (PLAYER_SIGNS[new_value] - PLAYER_SIGNS[old_value]) * CENTER_VALUES[cell]
+        # only pairs with a changed cell can have been made or broken
+        pairs += count_adjacent_pairs(black, changed) - count_adjacent_pairs(self._black, changed) \
+            - count_adjacent_pairs(white, changed) + count_adjacent_pairs(self._white, changed)
+        return (centering, pairs, black_count + (black & changed).bit_count() - (self._black & changed).bit_count(),
+                white_count + (white & changed).bit_count() - (self._white & changed).bit_count())
+
+    def copy(self):
+        """
+        Returns a copy of this state.
+
+        :return: a State object
+        """
+        state = State(self._player)
+        state._black = self._black
+        state._white = self._white
+        state._hash = self._hash
+        state._eval_terms = self._eval_terms
+        return state
+
     def copy_current_board(self):
         """
         Returns a deep copy of the current board.
@@ -201,8 +415,16 @@ class State:
         new_board = [[None for col in range(11)] for row in range(11)]
         for row in range(11):
             for col in range(11):
-                current_node = self.board[row][col]
-                new_board[row][col] = Node(current_node.node_value, current_node.row, current_node.column)
+                cell = CELL_INDEX[row][col]
+                if cell == -1:
+                    node_value = NodeValue.INVALID
+                elif self._black & CELL_BITS[cell]:
+                    node_value = NodeValue.BLACK
+                elif self._white & CELL_BITS[cell]:
+                    node_value = NodeValue.WHITE
+                else:
+                    node_value = NodeValue.EMPTY
+                new_board[row][col] = Node(node_value, row, col)
         return new_board
 
     def calculate_game_scores(self):
@@ -14,7 +14,9 @@ from state_space_gen.state_space_generator import StateSpaceGenerator
 from core.game import Game
 from gui.settings import *
 from layouts import layout_arrays
+from ai.ponder import Ponderer
 from ai.search import AlphaBeta
+from ai.time_manager import TimeManager
 
 
 class GUI:
@@ -75,6 +77,8 @@ class GUI:
         self.selected_buttons = set()
 
         self.alpha_beta = AlphaBeta(2)
+        self.time_manager = TimeManager()
+        self.ponderer = Ponderer(self.alpha_beta, self.time_manager)
         # HEURISTICS
         self.heuristic1 = Heuristics.evaluate  # for Black
         self.heuristic2 = Heuristics.evaluate  # for White
@@ -419,6 +423,7 @@ class GUI:
 
         :return: None
         """
+        self.ponderer.stop()
         self.settings = Settings(self.layout_var.get(), self.colour_var.get(), self.gamemode_var.get(),
                                  self.move_limit_var.get(), self.time_limit_p1_var.get(), self.time_limit_p2_var.get())
         self.settings_window.destroy()
@@ -590,11 +595,14 @@ class GUI:
 
     def make_ai_move(self):
         heuristic = self.heuristic1 if self.game.state.player == 1 else self.heuristic2
-        ai_move = self.alpha_beta.start_new_search(self.game.state, heuristic)
+        ai_move = self.ponderer.choose_move(self.game, heuristic)
         if self.game.state.player == 1:
             self.player_1_make_move(ai_move)
         else:
             self.player_2_make_move(ai_move)
+        if self.gamemode_var.get() == GameMode.HUMAN_AI.value and not self.game.is_game_over():
+            # think on the human's time, in the background so the board stays responsive
+            self.ponderer.start(self.game, ai_move, heuristic)
         if self.gamemode_var == GameMode.AI_AI.value:
             if not self.game.is_game_over():
                 self.make_ai_move()
@@ -677,6 +685,7 @@ class GUI:
 
         :return: None
         """
+        self.ponderer.stop()
         self.window.destroy()
 
     def player_1_make_move(self, move):
@@ -0,0 +1,165 @@
+"""
+Precomputed tables for the 61 playable cells of the board.
+
+- cells are numbered 0 to 60 in row-major order over VALID_NODES
+- bit i of a bitboard is set when cell i holds a marble
+- CELL_INDEX maps (row, column) to a cell number, or -1 if it is not a space
+- directions are numbered 0 to 5 in the order of core.move.Direction
+- NEIGHBOURS[cell][direction] is the adjacent cell, or -1 off the board
+- SEGMENTS lists every line of 2 or 3 cells, running from its first cell in a left direction
+- CENTER_VALUES[cell] is how central a cell is, as scored by ai.heuristics.Heuristics.center_value
+- ZOBRIST_KEYS[cell][player] is the hash key of player's marble on cell
+"""
+from math import isqrt
+from random import Random
+
+from layouts.layout_arrays import VALID_NODES
+
+CELL_COORDS = [(row, column) for row in range(11) for column in range(11) if VALID_NODES[row][column]]
+
+CELL_COUNT = len(CELL_COORDS)
+
+CELL_INDEX = [[-1 for column in range(11)] for row in range(11)]
+for _cell, (_row, _column) in enumerate(CELL_COORDS):
+    CELL_INDEX[_row][_column] = _cell
+
+CELL_BITS = [1 << cell for cell in range(CELL_COUNT)]
+
+# Bitboard with every playable cell set
+ALL_CELLS = (1 << CELL_COUNT) - 1
+
+# (row, column) offsets in the order of core.move.Direction: L, R, TL, TR, BL, BR
+DIRECTION_OFFSETS = ((0, -1), (0, 1), (-1, 0), (-1, 1), (1, -1), (1, 0))
+OPPOSITE_DIRECTIONS = (1, 0, 5, 4, 3, 2)
+LEFT_DIRECTIONS = (0, 2, 4)
+
+NEIGHBOURS = [tuple(CELL_INDEX[row + row_offset][column + column_offset]
+                    for row_offset, column_offset in DIRECTION_OFFSETS)
+              for row, column in CELL_COORDS]
+
+# Bitboard of the cells adjacent to each cell
+NEIGHBOUR_MASKS = [sum(CELL_BITS[neighbour] for neighbour in NEIGHBOURS[cell] if neighbour != -1)
+                   for cell in range(CELL_COUNT)]
+
+
+def _get_ray(cell, direction, length):
+    """
+    Returns the given number of cells past the given cell in the given direction,
+    padded with -1 once the ray leaves the board.
+
+    :param cell: an int
+    :param direction: an int
+    :param length: an int
+    :return: a tuple of ints
+    """
+    ray = []
+    for _ in range(length):
+        cell = NEIGHBOURS[cell][direction] if cell != -1 else -1
+        ray.append(cell)
+    return tuple(ray)
+
+
+SEGMENTS = []  # tuples of cells
+SEGMENT_DIRECTIONS = []  # the left direction each segment runs in
+for _cell in range(CELL_COUNT):
+    for _direction in LEFT_DIRECTIONS:
+        for _length in (2, 3):
+            _segment = (_cell,) + _get_ray(_cell, _direction, _length - 1)
+            if -1 not in _segment:
+                SEGMENTS.append(_segment)
+                SEGMENT_DIRECTIONS.append(_direction)
+
+SEGMENT_MASKS = [sum(CELL_BITS[cell] for cell in segment) for segment in SEGMENTS]
+
+# Maps a segment's (first cell, last cell) to its index in SEGMENTS
+SEGMENT_INDEX = {(segment[0], segment[-1]): index for index, segment in enumerate(SEGMENTS)}
+
+# INLINE_RAYS[segment][direction] is None unless the direction runs along the segment,
+# in which case it is (trailing cell, push ray): the trailing marble's cell, which is
+# emptied, and the cells in front of the leading marble, as many as the segment is long.
+INLINE_RAYS = [[None] * 6 for _ in SEGMENTS]
+
+# SIDESTEP_TARGETS[segment][direction] is the cells the segment's marbles move to,
+# or None if the direction runs along the segment or leaves the board.
+SIDESTEP_TARGETS = [[None] * 6 for _ in SEGMENTS]
+
+for _index, _segment in enumerate(SEGMENTS):
+    for _direction in range(6):
+        if _direction == SEGMENT_DIRECTIONS[_index]:
+            INLINE_RAYS[_index][_direction] = _segment[0], _get_ray(_segment[-1], _direction, len(_segment))
+        elif _direction == OPPOSITE_DIRECTIONS[SEGMENT_DIRECTIONS[_index]]:
+            INLINE_RAYS[_index][_direction] = _segment[-1], _get_ray(_segment[0], _direction, len(_segment))
+        else:
+            _targets = tuple(NEIGHBOURS[cell][_direction] for cell in _segment)
+            if -1 not in _targets:
+                SIDESTEP_TARGETS[_index][_direction] = _targets
+
+
+# (6 - horizontal distance)^2 + (6 - vertical distance)^2 from the centre, in half-cells horizontally
+CENTER_VALUES = [(6 - abs(7.5 - (row / 2 + column))) ** 2 + (6 - abs(5 - row)) ** 2 for row, column in CELL_COORDS]
+
+# CENTER_VALUE_BOUNDS[n] is the (lowest, highest) sum of CENTER_VALUES over any n cells
+_SORTED_CENTER_VALUES = sorted(CENTER_VALUES)
+CENTER_VALUE_BOUNDS = [(sum(_SORTED_CENTER_VALUES[:count]), sum(_SORTED_CENTER_VALUES[CELL_COUNT - count:]))
+                       for count in range(CELL_COUNT + 1)]
+
+
+def get_cells_from_bitboard(bitboard):
+    """
+    Yields the cell number of every bit set in the given bitboard, lowest first.
+
+    :param bitboard: an int
+    :return: a generator of ints
+    """
+    while bitboard:
+        lowest_bit = bitboard & -bitboard
+        yield lowest_bit.bit_length() - 1
+        bitboard ^= lowest_bit
+
+
+def count_adjacent_pairs(bitboard, mask=ALL_CELLS):
+    """
+    Returns the number of pairs of adjacent cells that are both set in the given
+    bitboard and that have at least one cell in the given mask.
+
+    :param bitboard: an int
+    :param mask: an int bitboard, every cell by default
+    :return: an int
+    """
+    total, inside = 0, 0
+    for cell in get_cells_from_bitboard(bitboard & mask):
+        neighbours = NEIGHBOUR_MASKS[cell] & bitboard
+        total += neighbours.bit_count()
+        inside += (neighbours & mask).bit_count()
+    # pairs with both cells in the mask were counted from each end
+    return total - inside // 2
+
+
+# MAX_ADJACENT_PAIRS[n] is the most pairs of adjacent cells n marbles can form: floor(3n - sqrt(12n - 3)),
+# reached by the most compact shapes (Harary and Harborth, 1976). Written with isqrt as 3n - ceil(sqrt(12n - 3)).
+MAX_ADJACENT_PAIRS = [0] + [3 * count - isqrt(12 * count - 4) - 1 for count in range(1, CELL_COUNT + 1)]
+
+
+def get_bitboards_from_layout(layout):
+    """
+    Returns the black and white bitboards for a 2d layout array such as DEFAULT_START.
+
+    :param layout: a 2d array of ints
+    :return: a tuple of two ints (black, white)
+    """
+    black, white = 0, 0
+    for cell, (row, column) in enumerate(CELL_COORDS):
+        if layout[row][column] == 1:
+            black |= CELL_BITS[cell]
+        elif layout[row][column] == 2:
+            white |= CELL_BITS[cell]
+    return black, white
+
+
+# Zobrist keys: one random 64 bit key per (cell, player), indexed by NodeValue so
+# invalid and empty spaces hash to 0, plus one that is mixed in when player 2 has
+# the turn. Seeded so hashes are stable between runs.
+_zobrist_random = Random(3981)
+ZOBRIST_KEYS = [[0, _zobrist_random.getrandbits(64), _zobrist_random.getrandbits(64), 0]
+                for cell in range(CELL_COUNT)]
+ZOBRIST_PLAYER_2_KEY = _zobrist_random.getrandbits(64)
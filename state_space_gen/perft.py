@@ -0,0 +1,145 @@
+"""
+This module houses the Perft class, which counts the positions the
+State Space Generator reaches to a given depth. The counts check the
+generator's correctness and the timings measure its speed.
+
+Run from the project root, with a starting layout number or an input file:
+    python -m state_space_gen.perft 1 3
+    python -m state_space_gen.perft dist/test_inputs/Test1.input 2 --divide
+"""
+import argparse
+import os
+from time import perf_counter
+
+from core.state import State
+from layouts import layout_arrays
+from state_space_gen.file_processor import FileProcessor
+from state_space_gen.state_space_generator import StateSpaceGenerator
+
+
+class Perft:
+    """
+    Counts the leaf positions of the move tree from a state to a given depth.
+    """
+
+    # Leaf counts for depths 1 to 3 from each starting layout, in layout_arrays.STARTING_LAYOUT order
+    EXPECTED_COUNTS = {1: [44, 1936, 98912],
+                       2: [52, 2692, 149322],
+                       3: [80, 6244, 493480]}
+
+    def __init__(self, state):
+        """
+        Initializes a Perft object.
+
+        :param state: a State object
+        """
+        self._state = state.copy()
+        self.nodes = 0  # positions whose moves were generated
+
+    @staticmethod
+    def get_state(source):
+        """
+        Returns the State for a starting layout number or an input file name.
+
+        :param source: a string of a layout number in STARTING_LAYOUT or a file name
+        :return: a State object
+        """
+        if source.isdigit():
+            return State.get_start_state(layout_arrays.STARTING_LAYOUT[int(source)])
+        return FileProcessor.get_state_from_file(source)
+
+    def count(self, depth):
+        """
+        Returns the number of leaf positions at the given depth.
+
+        :param depth: an int of at least 1
+        :return: an int
+        """
+        return self.count_leaves(self._state, depth)
+
+    def divide(self, depth):
+        """
+        Returns the number of leaf positions at the given depth below each root move.
+
+        :param depth: an int of at least 1
+        :return: a list of (Move, int) tuples
+        """
+        self.nodes += 1
+        results = []
+        for move in StateSpaceGenerator(self._state).generate_all_valid_moves():
+            undo = self._state.make_move(move)
+            results.append((move, self.count_leaves(self._state, depth - 1) if depth > 1 else 1))
+            self._state.unmake_move(undo)
+        return results
+
+    def count_leaves(self, state, depth):
+        """
+        Returns the number of leaf positions at the given depth below the given state.
+        Moves at the last ply are counted rather than made.
+
+        :param state: a State object, left unchanged
+        :param depth: an int of at least 0, where 0 counts the state itself
+        :return: an int
+        """
+        if depth == 0:
+            return 1
+        self.nodes += 1
+        moves = StateSpaceGenerator(state).generate_all_valid_moves()
+        if depth == 1:
+            return len(moves)
+        total = 0
+        for move in moves:
+            undo = state.make_move(move)
+            total += self.count_leaves(state, depth - 1)
+            state.unmake_move(undo)
+        return total
+
+
+def get_depth(text):
+    """
+    Returns the depth given on the command line, rejecting any below 1.
+
+    :param text: a string
+    :return: an int of at least 1
+    """
+    try:
+        depth = int(text)
+    except ValueError:
+        depth = 0
+    if depth < 1:
+        raise argparse.ArgumentTypeError(f"must be a whole number of at least 1, not {text!r}")
+    return depth
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Counts positions reached by the State Space Generator.")
+    parser.add_argument("source", help="a starting layout number (1-3) or the name of an .input file")
+    parser.add_argument("depth", type=get_depth, help="the depth to count to, at least 1")
+    parser.add_argument("--divide", action="store_true", help="break the count down by root move")
+    args = parser.parse_args()
+    if args.source.isdigit() and int(args.source) not in layout_arrays.STARTING_LAYOUT:
+        parser.error(f"no starting layout {args.source}, choose from "
+                     f"{', '.join(str(layout) for layout in layout_arrays.STARTING_LAYOUT)}")
+    if not args.source.isdigit() and not os.path.isfile(args.source):
+        parser.error(f"no such input file: {args.source}")
+
+    perft = Perft(Perft.get_state(args.source))
+    start = perf_counter()
+    if args.divide:
+        results = perft.divide(args.depth)
+        for move, count in results:
+            print(f"{move}: {count}")
+        total = sum(count for _, count in results)
+    else:
+        total = perft.count(args.depth)
+    timer = perf_counter() - start
+
+    print(f"Depth {args.depth}: {total} positions in {timer:.3f}s "
+          f"({total / timer:.0f} positions/s, {perft.nodes / timer:.0f} generator calls/s)")
+    expected = Perft.EXPECTED_COUNTS.get(int(args.source), []) if args.source.isdigit() else []
+    if args.depth <= len(expected) and total != expected[args.depth - 1]:
+        print(f"MISMATCH: expected {expected[args.depth - 1]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,18 @@
 """
 This module houses the StateSpaceGenerator class.
 """
-from core.node import NodeValue
+from core.node import Node, NodeValue
 from core.move import Move, Direction, MoveType, ChangeMatrix
 from core.state import State
+from layouts.board_tables import ALL_CELLS, CELL_BITS, CELL_COORDS, CELL_COUNT, CELL_INDEX, NEIGHBOURS, SEGMENTS, \
+    SEGMENT_MASKS, SEGMENT_INDEX, SEGMENT_DIRECTIONS, OPPOSITE_DIRECTIONS, INLINE_RAYS, SIDESTEP_TARGETS, \
+    get_cells_from_bitboard
+
+# Directions in the order layouts.board_tables numbers them
+DIRECTIONS = list(Direction)
+DIRECTION_INDICES = {direction: index for index, direction in enumerate(DIRECTIONS)}
+
+EMPTY = NodeValue.EMPTY.value
 
 
 class StateSpaceGenerator:
@@ -108,6 +117,82 @@ class StateSpaceGenerator:
         self.valid_moves = self.sort_moves(self.valid_moves)
         return self.valid_moves
 
+    def generate_valid_moves_lazily(self, first_move_key=None, killer_move_keys=(), history=None):
+        """
+        Yields the legal moves from the starting state one at a time, in the
+        order generate_all_valid_moves returns them. One-marble moves are only
+        generated once every multi-marble move has been yielded, so a caller
+        that stops early skips that work.
+
+        Given killer moves or a history table, the quiet moves (neither Push nor
+        Scoring) come after the others in a different order: the killer moves that
+        are legal here first, then the rest by history score, highest first.
+
+        :param first_move_key: the key of a move to try first, such as a stored best move
+        :param killer_move_keys: a list of keys of quiet moves that caused cutoffs elsewhere
+        :param history: a dict of move key: score, higher for moves that caused more cutoffs
+        :return: a generator of Moves
+        """
+        yielded_keys = set()
+        if first_move_key is not None:
+            first_move = self.generate_move_from_key(first_move_key)
+            if first_move:
+                yielded_keys.add(first_move_key)
+                yield first_move
+        multi_marble_moves = self.sort_moves(self.generate_multi_marbles_moves())
+
+        if not killer_move_keys and history is None:
+            for move in multi_marble_moves:
+                if move.key not in yielded_keys:
+                    yield move
+            for move in self.generate_one_marble_moves():
+                if move.key not in yielded_keys:
+                    yield move
+            return
+
+        quiet_moves = []
+        for move in multi_marble_moves:
+            if move.move_type != MoveType.Push and move.move_type != MoveType.Scoring:
+                quiet_moves.append(move)
+            elif move.key not in yielded_keys:
+                yielded_keys.add(move.key)
+                yield move
+        for killer_move_key in killer_move_keys:
+            if killer_move_key not in yielded_keys:
+                killer_move = self.generate_move_from_key(killer_move_key)
+                if killer_move:
+                    yielded_keys.add(killer_move_key)
+                    yield killer_move
+        quiet_moves.extend(self.generate_one_marble_moves())
+        if history:
+            quiet_moves.sort(key=lambda quiet_move: history.get(quiet_move.key, 0), reverse=True)
+        for move in quiet_moves:
+            if move.key not in yielded_keys:
+                yield move
+
+    def generate_move_from_key(self, move_key):
+        """
+        Rebuilds the move with the given key if it is legal in the starting state.
+
+        :param move_key: an int from Move.key
+        :return: a Move object, or None if the move is not legal here
+        """
+        start_cell, end_cell = move_key >> 10, (move_key >> 4) & 63
+        direction = Direction.get_direction_from_clock(move_key & 15)
+        if direction is None or start_cell >= CELL_COUNT:
+            return None
+        own, _, empty = self.get_bitboards()
+        if start_cell == end_cell:
+            adj_cell = NEIGHBOURS[start_cell][DIRECTION_INDICES[direction]]
+            if own & CELL_BITS[start_cell] and adj_cell != -1 and empty & CELL_BITS[adj_cell]:
+                return self.create_move(MoveType.Inline, start_cell, start_cell, DIRECTION_INDICES[direction],
+                                        ((start_cell, self.state.player, EMPTY), (adj_cell, EMPTY, self.state.player)))
+            return None
+        segment = SEGMENT_INDEX.get((start_cell, end_cell))
+        if segment is None or own & SEGMENT_MASKS[segment] != SEGMENT_MASKS[segment]:
+            return None
+        return self.process_segment_move(segment, DIRECTION_INDICES[direction])
+
     def generate_next_states(self):
         """
         Generates a list of next states by applying all the generated legal
@@ -119,22 +204,50 @@ class StateSpaceGenerator:
         self.next_states = [self.state.apply_move(move) for move in self.valid_moves]
         return self.next_states
 
+    def get_bitboards(self):
+        """
+        Returns the bitboards of the current player's marbles, the other player's
+        marbles and the empty cells.
+
+        :return: a tuple of three ints
+        """
+        own = self.state.get_bitboard_for_player(self.state.player)
+        other = self.state.get_bitboard_for_player(State.get_other_player_num(self.state.player))
+        return own, other, ALL_CELLS ^ own ^ other
+
+    def create_move(self, move_type, start_cell, end_cell, direction, changes, start_node=None, end_node=None):
+        """
+        Returns a Move of the current player's marbles from the given cells.
+
+        :param move_type: a MoveType enum object
+        :param start_cell: an int
+        :param end_cell: an int
+        :param direction: an int index into DIRECTIONS
+        :param changes: a tuple of (cell, old value, new value) tuples of ints
+        :param start_node: a Node to use as the start node instead of a new one
+        :param end_node: a Node to use as the end node instead of a new one
+        :return: a Move object
+        """
+        if start_node is None:
+            node_value = NodeValue(self.state.player)
+            start_node = Node(node_value, *CELL_COORDS[start_cell])
+            end_node = start_node if start_cell == end_cell else Node(node_value, *CELL_COORDS[end_cell])
+        return Move(move_type, start_node, end_node, DIRECTIONS[direction], ChangeMatrix.from_changes(changes))
+
     def generate_one_marble_moves(self):
         """
         Generates all legal one-marble moves.
 
         :return: a list of Moves
         """
-        curr_player_marbles = self.state.get_all_nodes_for_player(self.state.player)
+        player = self.state.player
+        own, _, empty = self.get_bitboards()
         valid_moves = []
-        for node in curr_player_marbles:
-            direction_dict = self.get_adjacent_nodes(node)
-            for direction, adj_node in direction_dict.items():
-                if adj_node.node_value == NodeValue.EMPTY:
-                    change_matrix = ChangeMatrix(self.state.player,
-                                                 [node],
-                                                 [adj_node])
-                    valid_moves.append(Move(MoveType.Inline, node, node, direction, change_matrix))
+        for cell in get_cells_from_bitboard(own):
+            for direction, adj_cell in enumerate(NEIGHBOURS[cell]):
+                if adj_cell != -1 and empty & CELL_BITS[adj_cell]:
+                    valid_moves.append(self.create_move(MoveType.Inline, cell, cell, direction,
+                                                        ((cell, player, EMPTY), (adj_cell, EMPTY, player))))
         return valid_moves
 
     def generate_multi_marbles_moves(self):
@@ -143,33 +256,66 @@ class StateSpaceGenerator:
 
         :return: a list of Moves
         """
-        two_marble_selections = self.get_valid_two_marble_selections()
-        two_marble_incomplete_moves_generator = (Move(MoveType.Unknown, node1, node2, direction)
-                                                 for (node1, node2) in two_marble_selections
-                                                 for direction in Direction)
-        two_marble_moves = [self.process_two_marble_move(move)
-                            for move in two_marble_incomplete_moves_generator]
-        valid_moves = [move for move in two_marble_moves if move.move_type != MoveType.Invalid]
-
-        three_marble_selections = self.get_valid_three_marble_selections()
-        three_marble_incomplete_moves_generator = (Move(MoveType.Unknown, node1, node2, direction)
-                                                   for (node1, node2) in three_marble_selections
-                                                   for direction in Direction)
-        three_marble_moves = [self.process_three_marble_move(move)
-                              for move in three_marble_incomplete_moves_generator]
-        valid_moves.extend([move for move in three_marble_moves if move.move_type != MoveType.Invalid])
+        own, other, empty = self.get_bitboards()
+        valid_moves = []
+        for segment, mask in enumerate(SEGMENT_MASKS):
+            if own & mask == mask:
+                for direction in range(6):
+                    move = self.process_segment_move(segment, direction, (own, other, empty))
+                    if move:
+                        valid_moves.append(move)
         return valid_moves
 
+    def generate_tactical_moves(self):
+        """
+        Generates only the legal Push and Scoring moves, Scoring moves first.
+        Sidesteps and inline moves without an opposing marble in front are
+        never built.
+
+        :return: a list of Moves
+        """
+        own, other, empty = self.get_bitboards()
+        scoring_moves, push_moves = [], []
+        for segment, mask in enumerate(SEGMENT_MASKS):
+            if own & mask == mask:
+                for direction in (SEGMENT_DIRECTIONS[segment], OPPOSITE_DIRECTIONS[SEGMENT_DIRECTIONS[segment]]):
+                    front_cell = INLINE_RAYS[segment][direction][1][0]
+                    if front_cell != -1 and other & CELL_BITS[front_cell]:
+                        move = self.process_segment_move(segment, direction, (own, other, empty))
+                        if move:
+                            (scoring_moves if move.move_type == MoveType.Scoring else push_moves).append(move)
+        return scoring_moves + push_moves
+
     def get_valid_two_marble_selections(self):
         """
-        Returns a set of tuples of nodes (Node1, Node2) for all valid 2 marble selections
+        Returns a list of tuples of nodes (Node1, Node2) for all valid 2 marble selections
+        for the current player.
+
+        :return: a list of tuples of Nodes, the valid selections for two marbles
+        """
+        return self.get_valid_selections(2)
+
+    def get_valid_three_marble_selections(self):
+        """
+        Returns a list of tuples of nodes (Node1, Node3) for all valid 3 marble selections
         for the current player.
 
-        :return: a set of tuples of Nodes, the valid selections for two marbles
+        :return: a list of tuples of nodes, the valid selections for three marbles
+        """
+        return self.get_valid_selections(3)
+
+    def get_valid_selections(self, length):
+        """
+        Returns a list of tuples of the first and last nodes of every line of the
+        current player's marbles of the given length.
+
+        :param length: an int equal to 2 or 3
+        :return: a list of tuples of Nodes
         """
-        curr_player_marbles = self.state.get_all_nodes_for_player(self.state.player)
-        return [(marble1, marble2) for marble1 in curr_player_marbles for marble2 in self.get_left_nodes(marble1)
-                if marble1.node_value == marble2.node_value]
+        own = self.state.get_bitboard_for_player(self.state.player)
+        return [(self.state.get_node(*CELL_COORDS[segment[0]]), self.state.get_node(*CELL_COORDS[segment[-1]]))
+                for segment, mask in zip(SEGMENTS, SEGMENT_MASKS)
+                if len(segment) == length and own & mask == mask]
 
     def process_two_marble_move(self, move):
         """
@@ -179,65 +325,7 @@ class StateSpaceGenerator:
         :param move: a Move object
         :return: a Move object
         """
-        moved_start_node = self.state.get_node_in_direction_of_node(
-            move.start_node, move.direction)  # location of start node after move
-        moved_end_node = self.state.get_node_in_direction_of_node(
-            move.end_node, move.direction)  # location of end node after move
-
-        if move.is_inline_move():
-            # first_pushed_node is the node that potentially will be pushed, so if A1-B1-TL, then it would be C1
-            first_pushed_node = moved_start_node if moved_end_node == move.start_node else moved_end_node
-
-            if first_pushed_node.node_value == NodeValue.INVALID:  # edge of board
-                return Move(MoveType.Invalid, move.start_node, move.end_node, move.direction)
-            if first_pushed_node.node_value == NodeValue.EMPTY:
-                change_matrix = ChangeMatrix(self.state.player,
-                                             [move.start_node, move.end_node],
-                                             [moved_start_node, moved_end_node])
-                return Move(MoveType.Inline, move.start_node, move.end_node, move.direction, change_matrix)
-            # if node being pushed is opposite colour
-            if first_pushed_node.node_value.value == abs(3 - move.start_node.node_value.value):
-                node_behind_pushed_node = self.state.get_node_in_direction_of_node(first_pushed_node,
-                                                                                   move.direction)
-                # if node behind pushed node is empty or off the board
-                if node_behind_pushed_node.node_value == NodeValue.INVALID:
-                    change_matrix = ChangeMatrix(self.state.player,
-                                                 [move.start_node, move.end_node],
-                                                 [moved_start_node, moved_end_node])
-                    return Move(MoveType.Scoring, move.start_node, move.end_node, move.direction, change_matrix)
-                if node_behind_pushed_node.node_value == NodeValue.EMPTY:
-                    change_matrix = ChangeMatrix(self.state.player,
-                                                 [move.start_node, move.end_node],
-                                                 [moved_start_node, moved_end_node],
-                                                 [node_behind_pushed_node])
-                    return Move(MoveType.Push, move.start_node, move.end_node, move.direction, change_matrix)
-        # sidestep move
-        else:
-            if (moved_start_node.node_value == NodeValue.EMPTY) \
-                    and (moved_end_node.node_value == NodeValue.EMPTY):
-                change_matrix = ChangeMatrix(self.state.player,
-                                             [move.start_node, move.end_node],
-                                             [moved_start_node, moved_end_node])
-                return Move(MoveType.Sidestep, move.start_node, move.end_node, move.direction, change_matrix)
-        return Move(MoveType.Invalid, move.start_node, move.end_node, move.direction)
-
-    def get_valid_three_marble_selections(self):
-        """
-        Returns a set of tuples of nodes (Node1, Node2) for all valid 3 marble selections
-        for the current player.
-
-        :return: a set of tuples of nodes, the valid selections for three marbles
-        """
-        valid_marble_selections = []
-        curr_player_marbles = self.state.get_all_nodes_for_player(self.state.player)
-        for marble1 in curr_player_marbles:
-            for direction in Direction.left_directions():
-                marble2 = self.state.get_node_in_direction_of_node(marble1, direction)
-                if marble2.node_value is not NodeValue.INVALID:
-                    marble3 = self.state.get_node_in_direction_of_node(marble2, direction)
-                    if (marble1.node_value == marble2.node_value) & (marble1.node_value == marble3.node_value):
-                        valid_marble_selections.append((marble1, marble3))
-        return valid_marble_selections
+        return self.process_multi_marble_move(move)
 
     def process_three_marble_move(self, move):
         """
@@ -247,81 +335,83 @@ class StateSpaceGenerator:
         :param move: a Move object
         :return: a Move object
         """
-        moved_start_node = self.state.get_node_in_direction_of_node(
-            move.start_node, move.direction)  # location of start node after move
-        moved_end_node = self.state.get_node_in_direction_of_node(
-            move.end_node, move.direction)  # location of end node after move
-        middle_node = None
-        for direction in Direction:
-            if self.state.get_node_in_opposite_direction_of_node(move.end_node, direction) \
-                    == self.state.get_node_in_direction_of_node(move.start_node, direction):
-                middle_node = self.state.get_node_in_direction_of_node(move.start_node, direction)
-
-        result_middle_node = self.state.get_node_in_direction_of_node(middle_node, move.direction)
-
-        if move.is_inline_move():
-            # first_pushed_node is the node that potentially will be pushed, so if A1-C1-TL, then it would be D1
-            first_pushed_node = moved_start_node if result_middle_node == move.start_node \
-                else moved_end_node
-
-            if first_pushed_node.node_value == NodeValue.INVALID:  # edge of board
-                return Move(MoveType.Invalid, move.start_node, move.end_node, move.direction)
-            if first_pushed_node.node_value == NodeValue.EMPTY:
-                change_matrix = ChangeMatrix(
-                    self.state.player,
-                    [move.start_node, middle_node, move.end_node],
-                    [moved_start_node, result_middle_node, moved_end_node])
-                return Move(MoveType.Inline, move.start_node, move.end_node, move.direction, change_matrix)
-            # if first_pushed_node is opposite colour
-            if first_pushed_node.node_value.value == abs(3 - move.start_node.node_value.value):
-                # second_pushed_node is the node behind first_pushed_node
-                second_pushed_node = self.state.get_node_in_direction_of_node(first_pushed_node, move.direction)
-                # if second_pushed_node is off the board or an empty space (3 pushing 1)
-                if second_pushed_node.node_value == NodeValue.INVALID:
-                    change_matrix = ChangeMatrix(
-                        self.state.player,
-                        [move.start_node, middle_node, move.end_node],
-                        [moved_start_node, result_middle_node, moved_end_node])
-                    return Move(MoveType.Scoring, move.start_node, move.end_node, move.direction, change_matrix)
-                if second_pushed_node.node_value == NodeValue.EMPTY:
-                    change_matrix = ChangeMatrix(
-                        self.state.player,
-                        [move.start_node, middle_node, move.end_node],
-                        [moved_start_node, result_middle_node, moved_end_node],
-                        [second_pushed_node])
-                    return Move(MoveType.Push, move.start_node, move.end_node, move.direction, change_matrix)
-                # if second_pushed_node is also opposite colour
-                if second_pushed_node.node_value.value == abs(3 - move.start_node.node_value.value):
-                    node_behind_second_pushed_node = self.state.get_node_in_direction_of_node(second_pushed_node,
-                                                                                              move.direction)
-                    # and if the node behind second_pushed_node is off the board or an empty space (3 pushing 2)
-                    if node_behind_second_pushed_node.node_value == NodeValue.INVALID:
-                        change_matrix = ChangeMatrix(
-                            self.state.player,
-                            [move.start_node, middle_node, move.end_node],
-                            [moved_start_node, result_middle_node, moved_end_node],
-                            [second_pushed_node])
-                        return Move(MoveType.Scoring, move.start_node, move.end_node, move.direction, change_matrix)
-                    if node_behind_second_pushed_node.node_value == NodeValue.EMPTY:
-                        change_matrix = ChangeMatrix(
-                            self.state.player,
-                            [move.start_node, middle_node, move.end_node],
-                            [moved_start_node, result_middle_node, moved_end_node],
-                            [second_pushed_node, node_behind_second_pushed_node])
-                        return Move(MoveType.Push, move.start_node, move.end_node, move.direction, change_matrix)
-        # sidestep move
-        else:
-            if (moved_start_node.node_value == NodeValue.EMPTY) & \
-                    (moved_end_node.node_value == NodeValue.EMPTY) & \
-                    (result_middle_node.node_value == NodeValue.EMPTY):
-                change_matrix = ChangeMatrix(
-                    self.state.player,
-                    [move.start_node, middle_node, move.end_node],
-                    [moved_start_node, result_middle_node,
-                     moved_end_node])
-                return Move(MoveType.Sidestep, move.start_node, move.end_node, move.direction, change_matrix)
+        return self.process_multi_marble_move(move)
+
+    def process_multi_marble_move(self, move):
+        """
+        Determines the type and change matrix (if applicable) of the given
+        two or three-marble move, whose start and end nodes may be in either order.
+
+        :param move: a Move object
+        :return: a Move object, with MoveType.Invalid if the move is not legal
+        """
+        start_cell = CELL_INDEX[move.start_node.row][move.start_node.column]
+        end_cell = CELL_INDEX[move.end_node.row][move.end_node.column]
+        segment = SEGMENT_INDEX.get((start_cell, end_cell), SEGMENT_INDEX.get((end_cell, start_cell)))
+        own = self.state.get_bitboard_for_player(self.state.player)
+        if segment is not None and own & SEGMENT_MASKS[segment] == SEGMENT_MASKS[segment]:
+            result = self.process_segment_move(segment, DIRECTION_INDICES[move.direction],
+                                               start_node=move.start_node, end_node=move.end_node)
+            if result:
+                return result
         return Move(MoveType.Invalid, move.start_node, move.end_node, move.direction)
 
+    def process_segment_move(self, segment, direction, bitboards=None, start_node=None, end_node=None):
+        """
+        Determines the type and changes of moving the current player's marbles on
+        the given segment in the given direction.
+
+        :param segment: an int index into SEGMENTS
+        :param direction: an int index into DIRECTIONS
+        :param bitboards: the tuple returned by get_bitboards, if already known
+        :param start_node: a Node to use as the move's start node
+        :param end_node: a Node to use as the move's end node
+        :return: a Move object, or None if the move is not legal
+        """
+        own, other, empty = bitboards or self.get_bitboards()
+        player = self.state.player
+        other_player = State.get_other_player_num(player)
+        cells = SEGMENTS[segment]
+        inline_ray = INLINE_RAYS[segment][direction]
+
+        if inline_ray:
+            trailing_cell, ray = inline_ray
+            # ray[0] is the cell that potentially will be pushed, so if A1-B1-TL, then it would be C1
+            if ray[0] == -1:  # edge of board
+                return None
+            if empty & CELL_BITS[ray[0]]:
+                return self.create_move(MoveType.Inline, cells[0], cells[-1], direction,
+                                        ((trailing_cell, player, EMPTY), (ray[0], EMPTY, player)),
+                                        start_node, end_node)
+            if not other & CELL_BITS[ray[0]]:
+                return None
+            # count the opposing marbles in a row, which must be fewer than the marbles pushing
+            pushed = 1
+            while pushed < len(cells) and ray[pushed] != -1 and other & CELL_BITS[ray[pushed]]:
+                pushed += 1
+            if pushed == len(cells):
+                return None
+            if ray[pushed] == -1:  # last pushed marble goes off the board
+                return self.create_move(MoveType.Scoring, cells[0], cells[-1], direction,
+                                        ((trailing_cell, player, EMPTY), (ray[0], other_player, player)),
+                                        start_node, end_node)
+            if empty & CELL_BITS[ray[pushed]]:
+                return self.create_move(MoveType.Push, cells[0], cells[-1], direction,
+                                        ((trailing_cell, player, EMPTY), (ray[0], other_player, player),
+                                         (ray[pushed], EMPTY, other_player)),
+                                        start_node, end_node)
+            return None
+
+        # sidestep move
+        targets = SIDESTEP_TARGETS[segment][direction]
+        if targets is None:
+            return None
+        for target in targets:
+            if not empty & CELL_BITS[target]:
+                return None
+        changes = tuple((cell, player, EMPTY) for cell in cells) + tuple((target, EMPTY, player) for target in targets)
+        return self.create_move(MoveType.Sidestep, cells[0], cells[-1], direction, changes, start_node, end_node)
+
     def get_adjacent_nodes(self, node):
         """
         Returns a dictionary with the adjacent nodes in all 6 directions.